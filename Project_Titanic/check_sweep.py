@@ -0,0 +1,115 @@
+"""
+Checks of the sweeps on synthetic data, e.g.
+
+    python check_sweep.py
+
+checks that:
+
+    seeds - every fit of a sweep gets its own seed, so the repeats of a
+        random model differ, and the results don't depend on the number
+        of workers
+    numpy grid - a grid of numpy values runs with a store and is found in
+        the store by a second run
+    resume - a sweep whose store was cut short fits only the missing fits
+        and gives the same results as an uninterrupted one
+
+The script exits with an error if any check fails.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from sweep import SweepStore, runSweep
+
+
+def syntheticArrays(seed=0):
+    """Function to return a small random train/test split of a classification problem"""
+    X, y = make_classification(400, 8, n_informative=4, random_state=seed)
+    return X[:300], y[:300], X[300:], y[300:]
+
+
+def checkSeeds(arrays):
+    """Function to check the repeats of a random model are independent"""
+    grid = {"n_estimators": [5, 10]}
+    serial = runSweep(RandomForestClassifier, grid, *arrays, repeats=8, workers=1)
+    pooled = runSweep(RandomForestClassifier, grid, *arrays, repeats=8, workers=4)
+
+    failures = []
+    if serial["seed"].nunique() != len(serial):
+        failures.append("seeds repeat between fits")
+    for trees, group in pooled.groupby("n_estimators"):
+        if group["accuracy"].nunique() < len(group) // 2:
+            failures.append(
+                "%i trees: only %i distinct accuracies in %i repeats"
+                % (trees, group["accuracy"].nunique(), len(group))
+            )
+    if not serial["accuracy"].equals(pooled["accuracy"]):
+        failures.append("results depend on the number of workers")
+    return failures
+
+
+def checkNumpyGrid(arrays, directory):
+    """Function to check a grid of numpy values is stored and found again"""
+    store = os.path.join(directory, "numpy.jsonl")
+    grid = {
+        "max_depth": np.arange(2, 6),
+        "min_samples_leaf": np.linspace(1, 5, 3, dtype=int),
+    }
+    first = runSweep(DecisionTreeClassifier, grid, *arrays, store=store, workers=2)
+
+    failures = []
+    if len(SweepStore(store).load()) != len(first):
+        failures.append("not every fit was stored")
+    second = runSweep(DecisionTreeClassifier, grid, *arrays, store=store, workers=2)
+    if not first["accuracy"].equals(second["accuracy"]):
+        failures.append("stored results differ from the sweep")
+    return failures
+
+
+def checkResume(arrays, directory):
+    """Function to check a sweep resumes from a store cut short"""
+    store = os.path.join(directory, "resume.jsonl")
+    grid = {"n_estimators": [5, 10, 20]}
+    full = runSweep(RandomForestClassifier, grid, *arrays, store=store, repeats=4)
+
+    # Keep half of the results and half of the next line
+    with open(store) as myfile:
+        lines = myfile.readlines()
+    with open(store, "w") as myfile:
+        myfile.writelines(lines[: len(lines) // 2])
+        myfile.write(lines[len(lines) // 2][:20])
+
+    resumed = runSweep(RandomForestClassifier, grid, *arrays, store=store, repeats=4)
+    failures = []
+    if not full["accuracy"].equals(resumed["accuracy"]):
+        failures.append("resumed results differ from the uninterrupted sweep")
+    if len(SweepStore(store).load()) != len(full):
+        failures.append("the store doesn't have every fit after resuming")
+    return failures
+
+
+if __name__ == "__main__":
+    arrays = syntheticArrays()
+    directory = tempfile.mkdtemp(prefix="check-sweep-")
+    try:
+        checks = {
+            "seeds": checkSeeds(arrays),
+            "numpy grid": checkNumpyGrid(arrays, directory),
+            "resume": checkResume(arrays, directory),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    failed = False
+    for name, failures in checks.items():
+        print("%s: %s" % (name, "; ".join(failures) or "ok"))
+        failed = failed or bool(failures)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,195 @@
+"""
+Preprocessing of the Titanic data shared by the notebooks, e.g.
+
+    from features import loadFeatures
+
+    features = loadFeatures("data/train.csv", "data/test.csv", family=True)
+    X_train, y_train = features["X_train"], features["y_train"]
+
+TitanicFeatures learns the values to fill the missing data with and the
+categories to encode from the training data, and turns any data of the
+same columns into the same feature columns. loadFeatures splits the
+training data, fits a StandardScaler to the training part and returns
+float32 feature matrices. The fitted pipeline and the matrices are cached
+under a hash of the csv files and the options, so they are only computed
+again when the data changes.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+# Columns not used as features and the categorical columns to encode
+dropped = ["Name", "Ticket", "Cabin"]
+categorical = ["Pclass", "Sex", "Embarked"]
+
+# Changing the features must change this to invalidate the cache
+version = 1
+
+
+def familySize(data):
+    """Function to return the number of family aboard with each passenger"""
+    return data["SibSp"] + data["Parch"]
+
+
+class TitanicFeatures:
+    """
+    Fit/transform preprocessing of the passenger data: missing ages filled
+    with the median age of the passenger's class and missing fares with the
+    mean fare of the class, both rounded, missing ports with the most common
+    port, and the categorical columns encoded as dummy variables. With
+    family, SibSp and Parch are replaced by their sum, Family.
+    """
+
+    def __init__(self, family=False):
+        self.family = family
+
+    def fit(self, data):
+        """Learn the fill values and categories from the training data"""
+        self.age_medians = data.groupby("Pclass")["Age"].median().round()
+        self.fare_means = data.groupby("Pclass")["Fare"].mean().round()
+        self.port = data["Embarked"].mode()[0]
+        self.categories = {
+            column: sorted(data[column].dropna().unique()) for column in categorical
+        }
+        self.columns = list(self.transform(data.head()).columns)
+        return self
+
+    def transform(self, data):
+        """Return the feature columns of data, without Survived if it has it"""
+        data = data.drop(dropped + ["Survived"], axis=1, errors="ignore")
+
+        # Fill the missing values from the training data's
+        data["Age"] = data["Age"].fillna(data["Pclass"].map(self.age_medians))
+        data["Fare"] = data["Fare"].fillna(data["Pclass"].map(self.fare_means))
+        data["Embarked"] = data["Embarked"].fillna(self.port)
+
+        if self.family:
+            data["Family"] = familySize(data)
+            data = data.drop(["SibSp", "Parch"], axis=1)
+
+        # Encode every categorical column at once, categories missing from
+        # the training data are all zeros
+        encoded = pd.get_dummies(
+            pd.DataFrame(
+                {
+                    column: pd.Categorical(
+                        data[column], categories=self.categories[column]
+                    )
+                    for column in categorical
+                },
+                index=data.index,
+            ),
+            prefix=categorical,
+        )
+        return pd.concat([data.drop(categorical, axis=1), encoded], axis=1)
+
+    def fit_transform(self, data):
+        return self.fit(data).transform(data)
+
+
+def fileHash(*paths):
+    """Function to return a hash of the contents of files"""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as myfile:
+            digest.update(hashlib.sha1(myfile.read()).digest())
+    return digest.hexdigest()
+
+
+def buildFeatures(train_path, test_path, family, test_size, random_state):
+    """
+    Function to fit the pipeline to the training csv and return it with the
+    scaled features of the train/test split and the competition data
+    """
+    data = pd.read_csv(train_path, index_col="PassengerId")
+    comp_data = pd.read_csv(test_path, index_col="PassengerId")
+
+    pipeline = TitanicFeatures(family).fit(data)
+    X = pipeline.transform(data)
+    y = data["Survived"]
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state
+    )
+
+    sc = StandardScaler()
+    X_train = sc.fit_transform(X_train)
+    arrays = {
+        "X_train": X_train.astype(np.float32),
+        "X_test": sc.transform(X_test).astype(np.float32),
+        "y_train": y_train.values,
+        "y_test": y_test.values,
+        "comp_X": sc.transform(pipeline.transform(comp_data)).astype(np.float32),
+        "comp_index": comp_data.index.values,
+    }
+    return {"pipeline": pipeline, "scaler": sc}, arrays
+
+
+def writeFile(path, write):
+    """
+    Function to write a file through write(temporary path), then rename it
+    so a half written file is never read
+    """
+    temp = "%s.%i.tmp" % (path, os.getpid())
+    write(temp)
+    os.replace(temp, path)
+
+
+def loadFeatures(
+    train_path="data/train.csv",
+    test_path="data/test.csv",
+    family=False,
+    test_size=0.2,
+    random_state=0,
+    cache_dir="data/cache",
+):
+    """
+    Function to return the features of the Titanic data as a dict of the
+    float32 X_train, X_test and comp_X, the y_train and y_test labels, the
+    comp_index passenger ids, the feature columns and the fitted pipeline
+    and scaler. They are loaded from cache_dir if the csv files and options
+    match, or built and saved there. cache_dir None disables the cache.
+    """
+    options = json.dumps([version, family, test_size, random_state])
+    key = fileHash(train_path, test_path) + hashlib.sha1(options.encode()).hexdigest()
+    key = hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    if cache_dir:
+        arrays_path = os.path.join(cache_dir, "features-%s.npz" % key)
+        fitted_path = os.path.join(cache_dir, "features-%s.pkl" % key)
+        try:
+            with open(fitted_path, "rb") as myfile:
+                fitted = pickle.load(myfile)
+            with np.load(arrays_path, allow_pickle=False) as npz:
+                arrays = dict(npz)
+            return dict(arrays, columns=fitted["pipeline"].columns, **fitted)
+        except (OSError, ValueError, pickle.UnpicklingError):
+            pass
+
+    fitted, arrays = buildFeatures(
+        train_path, test_path, family, test_size, random_state
+    )
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+        def writeArrays(temp):
+            with open(temp, "wb") as myfile:
+                np.savez(myfile, **arrays)
+
+        def writeFitted(temp):
+            with open(temp, "wb") as myfile:
+                pickle.dump(fitted, myfile)
+
+        # The arrays are written first, they are only read if the pipeline is there
+        writeFile(arrays_path, writeArrays)
+        writeFile(fitted_path, writeFitted)
+        print("Saved the features to %s" % arrays_path)
+
+    return dict(arrays, columns=fitted["pipeline"].columns, **fitted)
@@ -0,0 +1,73 @@
+"""
+Accuracy of K Nearest Neighbors for every number of neighbors at once, e.g.
+
+    from knn import knnAccuracy
+
+    results = knnAccuracy(X_train, y_train, X_test, y_test, range(5, 251))
+    results.plot(marker="o")
+
+The neighbors of each test point are found once, sorted by distance, up to
+the largest k. The prediction for every k is then the majority of the
+labels of the first k neighbors, counted cumulatively along the sorted
+neighbors, which gives the same predictions as fitting a
+KNeighborsClassifier for each k: uniform weights, and ties going to the
+smallest label.
+
+Neighbors at the same distance, e.g. passengers with the same features,
+are taken in the order of the training data. KNeighborsClassifier takes
+them in whatever order its search finds them, which changes with k, so
+the two can differ when such a tie straddles the kth neighbor.
+"""
+
+import numpy as np
+import pandas as pd
+import sklearn.metrics as metrics
+from sklearn.neighbors import NearestNeighbors
+
+
+def neighborLabels(X_train, y_train, X_test, max_k, metric="minkowski", p=2):
+    """
+    Function to return the labels of the max_k nearest training points of
+    each test point, nearest first and in order of the training data at
+    the same distance, as indices into the sorted classes, and the classes
+    """
+    classes, y_train = np.unique(np.asarray(y_train), return_inverse=True)
+    neighbors = NearestNeighbors(n_neighbors=max_k, metric=metric, p=p)
+    neighbors.fit(X_train)
+    distances, indices = neighbors.kneighbors(X_test)
+
+    # Sort by distance then index, the search's order of ties is arbitrary
+    order = np.lexsort((indices, distances), axis=1)
+    indices = np.take_along_axis(indices, order, axis=1)
+    return y_train[indices], classes
+
+
+def knnPredictions(labels, classes, ks):
+    """
+    Function to return the predictions of each k of ks from the sorted
+    neighbor labels of neighborLabels, one row per k
+    """
+    # Votes for each class among the first k neighbors, for every k
+    votes = np.zeros(labels.shape + (len(classes),), dtype=np.int32)
+    np.put_along_axis(votes, labels[..., None], 1, axis=2)
+    votes = np.cumsum(votes, axis=1)
+
+    # argmax takes the first of tied classes, the smallest label
+    ks = np.asarray(ks)
+    return classes[votes[:, ks - 1].argmax(axis=2).T]
+
+
+def knnAccuracy(X_train, y_train, X_test, y_test, ks, metric="minkowski", p=2):
+    """
+    Function to return the accuracy on the test data of K Nearest Neighbors
+    for each number of neighbors in ks, as a series indexed by k
+    """
+    ks = list(ks)
+    labels, classes = neighborLabels(X_train, y_train, X_test, max(ks), metric, p)
+    predictions = knnPredictions(labels, classes, ks)
+    y_test = np.asarray(y_test)
+    return pd.Series(
+        [metrics.accuracy_score(y_test, y_pred) for y_pred in predictions],
+        index=pd.Index(ks, name="n_neighbors"),
+        name="accuracy",
+    )
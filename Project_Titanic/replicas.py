@@ -0,0 +1,173 @@
+"""
+Training of many independent copies of the notebooks' ANN at once, e.g.
+
+    from replicas import ReplicaMLP
+
+    model = ReplicaMLP(30, X_train.shape[1], neurons=8, layers=2)
+    model.fit(X_train, y_train, epochs=200)
+    ac_scores = model.accuracy(X_test, y_test)
+
+trains 30 networks, each with its own initial weights and order of
+batches, and returns the accuracy of each. The networks only have a
+handful of units, so training them one after another in Keras is mostly
+spent on the overhead of each model and batch. Here the weights of every
+replica are stacked along a first axis and each batch is one set of
+matrix products for all of them.
+
+The networks and their training are those of buildModel in training.py:
+relu hidden layers and a sigmoid output, glorot uniform weights and zero
+biases, mean squared error minimised by Adam with the Keras defaults,
+batches of 32 shuffled each epoch.
+"""
+
+import numpy as np
+
+# Output of the sigmoid above which a passenger is predicted to survive
+threshold = 0.6
+
+
+class ReplicaMLP:
+    """
+    replicas independent multilayer perceptrons with layers hidden layers of
+    neurons relu units and one sigmoid output, trained together. Weights
+    are float32 arrays of shape (replicas, inputs, outputs) and biases of
+    shape (replicas, 1, outputs).
+    """
+
+    def __init__(
+        self,
+        replicas,
+        inputs,
+        neurons=8,
+        layers=2,
+        learning_rate=0.001,
+        beta_1=0.9,
+        beta_2=0.999,
+        epsilon=1e-7,
+        seed=None,
+    ):
+        self.replicas = replicas
+        self.learning_rate = learning_rate
+        self.beta_1, self.beta_2, self.epsilon = beta_1, beta_2, epsilon
+        self.rng = np.random.default_rng(seed)
+
+        # Glorot uniform weights, drawn separately for every replica
+        sizes = [inputs] + [neurons] * layers + [1]
+        self.params = []
+        for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+            limit = np.sqrt(6 / (fan_in + fan_out))
+            weights = self.rng.uniform(-limit, limit, (replicas, fan_in, fan_out))
+            self.params.append(weights.astype(np.float32))
+            self.params.append(np.zeros((replicas, 1, fan_out), dtype=np.float32))
+
+        # Adam moments and step
+        self._m = [np.zeros_like(p) for p in self.params]
+        self._v = [np.zeros_like(p) for p in self.params]
+        self._t = 0
+        self.history = {"loss": []}
+
+    def _forward(self, X):
+        """Return the activations of every layer for a (replicas, n, inputs) X"""
+        activations = [X]
+        last = len(self.params) // 2 - 1
+        for i in range(0, len(self.params), 2):
+            z = activations[-1] @ self.params[i] + self.params[i + 1]
+            if i // 2 == last:
+                activations.append(1 / (1 + np.exp(-z)))
+            else:
+                activations.append(np.maximum(z, 0))
+        return activations
+
+    def predict(self, X):
+        """Return the output of every replica for X, of shape (replicas, n)"""
+        X = np.asarray(X, dtype=np.float32)
+        X = np.broadcast_to(X, (self.replicas,) + X.shape)
+        return self._forward(X)[-1][..., 0]
+
+    def accuracy(self, X, y, threshold=threshold):
+        """Return the accuracy of each replica on X, y with predictions thresholded"""
+        y_pred = self.predict(X) > threshold
+        return (y_pred == np.asarray(y, dtype=bool)).mean(axis=1)
+
+    def _step(self, X, y):
+        """Take one Adam step on a batch of each replica, returning the losses"""
+        activations = self._forward(X)
+        output = activations[-1][..., 0]
+        error = output - y
+
+        # Mean squared error through the sigmoid, then back through the layers
+        delta = (2 / y.shape[1] * error * output * (1 - output))[..., None]
+        grads = [None] * len(self.params)
+        for i in range(len(self.params) - 2, -1, -2):
+            grads[i] = activations[i // 2].transpose(0, 2, 1) @ delta
+            grads[i + 1] = delta.sum(axis=1, keepdims=True)
+            if i:
+                delta = (delta @ self.params[i].transpose(0, 2, 1)) * (
+                    activations[i // 2] > 0
+                )
+
+        self._t += 1
+        b1, b2 = self.beta_1, self.beta_2
+        rate = self.learning_rate * np.sqrt(1 - b2**self._t) / (1 - b1**self._t)
+        for p, g, m, v in zip(self.params, grads, self._m, self._v):
+            m += (1 - b1) * (g - m)
+            v += (1 - b2) * (g * g - v)
+            p -= rate * m / (np.sqrt(v) + self.epsilon)
+
+        return (error * error).mean(axis=1)
+
+    def fit(self, X, y, epochs, batch_size=32, callback=None):
+        """
+        Train every replica for epochs epochs of X, y, each shuffling the
+        data separately. callback(epoch, model), if given, is called at the
+        end of every epoch counting from 1. The mean training loss of each
+        replica per epoch is added to history["loss"].
+        """
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y, dtype=np.float32)
+        n = len(X)
+
+        for epoch in range(1, epochs + 1):
+            order = self.rng.random((self.replicas, n)).argsort(axis=1)
+            losses = np.zeros(self.replicas)
+            for start in range(0, n, batch_size):
+                batch = order[:, start : start + batch_size]
+                losses += self._step(X[batch], y[batch]) * batch.shape[1]
+            self.history["loss"].append(losses / n)
+
+            if callback is not None:
+                callback(epoch, self)
+        return self
+
+
+def replicaAccuracy(
+    repeats,
+    X_train,
+    y_train,
+    X_test,
+    y_test,
+    epochs=200,
+    neurons=8,
+    layers=2,
+    score_epochs=None,
+    seed=None,
+):
+    """
+    Function to train repeats replicas of the ANN together and return the
+    accuracy of each on the test data, an array of repeats scores, or with
+    score_epochs a dict of the scores after each of those epochs
+    """
+    model = ReplicaMLP(repeats, X_train.shape[1], neurons, layers, seed=seed)
+    if score_epochs is None:
+        model.fit(X_train, y_train, epochs)
+        return model.accuracy(X_test, y_test)
+
+    score_epochs = set(score_epochs)
+    scores = {}
+
+    def score(epoch, model):
+        if epoch in score_epochs:
+            scores[epoch] = model.accuracy(X_test, y_test)
+
+    model.fit(X_train, y_train, max(score_epochs), callback=score)
+    return scores
@@ -0,0 +1,243 @@
+"""
+Parallel, resumable hyperparameter sweeps of the classifiers, e.g.
+
+    from sklearn.svm import SVC
+    from sweep import runSweep
+
+    results = runSweep(
+        SVC,
+        {"kernel": ["poly"], "degree": range(10), "random_state": [0]},
+        X_train, y_train, X_test, y_test,
+        store="results/sweeps/svc.jsonl",
+    )
+    results.plot(x="degree", y="accuracy", marker="o")
+
+Every combination of the parameter grid is fitted, repeats times each for
+models whose fits vary, across a pool of worker processes. The training
+and test arrays are written once to memory mapped files which every
+worker reads, rather than being pickled for each fit. Each finished fit
+is appended to the store as soon as it is done, keyed by the model, its
+parameters, the repeat, its seed and a hash of the data, so an interrupted
+sweep picks up where it left off and no fit is ever repeated for the same
+data.
+
+Every fit gets its own seed, derived from the sweep's seed, the model, its
+parameters and the repeat. It is passed as random_state to models that
+take one, and numpy's global random state is seeded with it otherwise, so
+forked workers don't all repeat the random state they inherited and a
+resumed sweep fits the same models as an uninterrupted one.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import sklearn.metrics as metrics
+from sklearn.model_selection import ParameterGrid
+
+array_names = ["X_train", "y_train", "X_test", "y_test"]
+
+# Arrays of the sweep being run, memory mapped by each worker process
+_arrays = None
+
+
+def dataHash(*arrays):
+    """Function to return a hash of the shape, type and values of arrays"""
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.shape, array.dtype.str)).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def jsonParams(params):
+    """
+    Function to return parameters as json text, the same for numpy and
+    python numbers, so it can be used as a key
+    """
+    return json.dumps(
+        {
+            name: getattr(value, "item", lambda: value)()
+            for name, value in params.items()
+        },
+        sort_keys=True,
+    )
+
+
+def fitSeed(seed, model, params, repeat):
+    """Function to return the seed of one fit of a sweep"""
+    text = json.dumps([seed, model, jsonParams(params), repeat])
+    return int(hashlib.sha1(text.encode()).hexdigest()[:8], 16)
+
+
+class SweepStore:
+    """
+    Results of the sweeps stored on disk as json lines, one per finished
+    fit. A line cut short by an interrupted write is ignored, and ended so
+    the next result starts on a line of its own.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model, params, repeat, data, seed):
+        return (model, jsonParams(params), repeat, data, seed)
+
+    def load(self):
+        """Return every stored result keyed by (model, params, repeat, data, seed)"""
+        results = {}
+        line = "\n"
+        try:
+            with open(self.path) as myfile:
+                for line in myfile:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    key = self.key(
+                        record["model"],
+                        record["params"],
+                        record["repeat"],
+                        record["data"],
+                        record.get("seed"),
+                    )
+                    results[key] = record
+        except FileNotFoundError:
+            pass
+        if not line.endswith("\n"):
+            with open(self.path, "a") as myfile:
+                myfile.write("\n")
+        return results
+
+    def add(self, record):
+        """Append a result, flushing it to disk straight away"""
+        with open(self.path, "a") as myfile:
+            myfile.write(json.dumps(record) + "\n")
+            myfile.flush()
+            os.fsync(myfile.fileno())
+
+
+def attachArrays(directory):
+    """Function to memory map the arrays of a sweep in a worker process"""
+    global _arrays
+    _arrays = {
+        name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+        for name in array_names
+    }
+
+
+def fitTask(task):
+    """
+    Function to fit and score one model of a sweep on the memory mapped
+    arrays, returning its accuracy on the test data and the time it took
+    """
+    factory, params, repeat, seed = task
+    start = time.time()
+    if "random_state" in inspect.signature(factory).parameters:
+        params = dict({"random_state": seed}, **params)
+    else:
+        np.random.seed(seed)
+    classifier = factory(**params)
+    classifier.fit(_arrays["X_train"], _arrays["y_train"])
+    y_pred = classifier.predict(_arrays["X_test"])
+    return {
+        "params": json.loads(jsonParams(task[1])),
+        "repeat": repeat,
+        "seed": seed,
+        "accuracy": float(metrics.accuracy_score(_arrays["y_test"], y_pred)),
+        "seconds": time.time() - start,
+    }
+
+
+def runSweep(
+    factory,
+    grid,
+    X_train,
+    y_train,
+    X_test,
+    y_test,
+    store=None,
+    repeats=1,
+    workers=None,
+    name=None,
+    seed=0,
+):
+    """
+    Function to fit factory(**params) for every combination of the grid,
+    a dict of parameter name to values, repeats times each and return a
+    dataframe of the parameters, repeat and test accuracy of every fit.
+    Fits already in the store, a json lines file, for the same data and
+    seed are not repeated. factory must be importable by the worker
+    processes, e.g. a sklearn classifier class. A random_state in the grid
+    is used in place of the seed of each fit.
+    """
+    name = name or factory.__name__
+    arrays = [np.asarray(array) for array in (X_train, y_train, X_test, y_test)]
+    data = dataHash(*arrays)
+
+    store = SweepStore(store) if store else None
+    done = store.load() if store else {}
+
+    tasks = [
+        (factory, params, repeat, fitSeed(seed, name, params, repeat))
+        for params in ParameterGrid(grid)
+        for repeat in range(repeats)
+    ]
+    todo = [
+        task
+        for task in tasks
+        if SweepStore.key(name, *task[1:3], data, task[3]) not in done
+    ]
+    print("%s: %i fits, %i already done" % (name, len(tasks), len(tasks) - len(todo)))
+
+    results = dict(done)
+    if todo:
+        # Write the arrays once for the workers to memory map
+        directory = tempfile.mkdtemp(prefix="sweep-")
+        try:
+            for array_name, array in zip(array_names, arrays):
+                np.save(os.path.join(directory, array_name + ".npy"), array)
+
+            start = time.time()
+            with ProcessPoolExecutor(
+                workers, initializer=attachArrays, initargs=(directory,)
+            ) as pool:
+                futures = [pool.submit(fitTask, task) for task in todo]
+                for future in as_completed(futures):
+                    record = dict(future.result(), model=name, data=data)
+                    if store:
+                        store.add(record)
+                    key = SweepStore.key(
+                        name, record["params"], record["repeat"], data, record["seed"]
+                    )
+                    results[key] = record
+            print("%s: %i fits in %.2fs" % (name, len(todo), time.time() - start))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    # Results in the order of the grid
+    rows = []
+    for factory, params, repeat, fit_seed in tasks:
+        record = results[SweepStore.key(name, params, repeat, data, fit_seed)]
+        rows.append(
+            dict(
+                params,
+                repeat=repeat,
+                seed=fit_seed,
+                accuracy=record["accuracy"],
+                seconds=record["seconds"],
+            )
+        )
+    return pd.DataFrame(rows)
@@ -0,0 +1,96 @@
+"""
+Evaluation of the ANN during training, so a study of the number of epochs
+needs one run per repeat rather than one per repeat and number of epochs,
+e.g.
+
+    from training import epochSweep
+
+    results = epochSweep([50, 100, 150, 200, 250, 300], 30, X_train, y_train, X_test, y_test)
+    results.boxplot()
+
+trains each repeat once for 300 epochs, scoring it on the test data after
+the 50th, 100th, ... epoch. The model after n epochs is the one a run of n
+epochs would have trained from the same starting weights, so the columns
+have the same distribution as separate runs, although the scores of one
+repeat are no longer independent of each other.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn.metrics as metrics
+import tensorflow as tf
+
+# Output of the sigmoid above which a passenger is predicted to survive
+threshold = 0.6
+
+
+def buildModel(neurons, layers=2):
+    """
+    Function to return the compiled ANN of the notebooks, layers hidden
+    layers of neurons relu units and a sigmoid output
+    """
+    ann = tf.keras.models.Sequential()
+    for i in range(layers):
+        ann.add(tf.keras.layers.Dense(units=neurons, activation="relu"))
+    ann.add(tf.keras.layers.Dense(units=1, activation="sigmoid"))
+
+    ann.compile(
+        optimizer="adam", loss="mean_squared_error", metrics=["mae", "mse", "mape"]
+    )
+    return ann
+
+
+class EpochAccuracy(tf.keras.callbacks.Callback):
+    """
+    Keras callback recording the accuracy of the model on test data, with
+    predictions thresholded at threshold, at the end of each of the given
+    epochs, counted from 1. The scores are kept in scores by epoch.
+    """
+
+    def __init__(self, X_test, y_test, epochs, threshold=threshold):
+        super().__init__()
+        self.X_test = np.asarray(X_test, dtype="float32")
+        self.y_test = np.asarray(y_test)
+        self.epochs = set(epochs)
+        self.threshold = threshold
+        self.scores = {}
+
+    def on_epoch_end(self, epoch, logs=None):
+        epoch += 1
+        if epoch not in self.epochs:
+            return
+
+        # Calling the model directly skips the set up predict does per call
+        y_pred = self.model(self.X_test, training=False).numpy()[:, 0] > self.threshold
+        self.scores[epoch] = metrics.accuracy_score(self.y_test, y_pred)
+
+
+def epochSweep(
+    epochs, repeats, X_train, y_train, X_test, y_test, neurons=8, layers=2, **fit
+):
+    """
+    Function to train repeats fresh models for the largest of epochs each,
+    returning a dataframe of their accuracy on the test data after each of
+    epochs, one row per repeat and one column per number of epochs. Extra
+    keyword arguments are passed to fit.
+    """
+    epochs = sorted(epochs)
+    fit = dict({"verbose": 0}, **fit)
+    callbacks = list(fit.pop("callbacks", []))
+
+    rows = []
+    start = time.time()
+    for i in range(repeats):
+        ann = buildModel(neurons, layers)
+        scorer = EpochAccuracy(X_test, y_test, epochs)
+        ann.fit(
+            X_train, y_train, epochs=epochs[-1], callbacks=callbacks + [scorer], **fit
+        )
+        rows.append(scorer.scores)
+
+    print(
+        "%i repeats of %i epochs in %.2fs" % (repeats, epochs[-1], time.time() - start)
+    )
+    return pd.DataFrame(rows, columns=epochs)
@@ -0,0 +1,127 @@
+// Clientside callbacks for the Irish Covid-19 Data Dashboard
+
+function noDataGraph() {
+    // Null graph object to be used where there is no data for a date,
+    // mirrors noDataGraph in figures.py
+    return {
+        layout: {
+            xaxis: {visible: false},
+            yaxis: {visible: false},
+            annotations: [
+                {
+                    text: "No matching data found",
+                    xref: "paper",
+                    yref: "paper",
+                    showarrow: false,
+                    font: {size: 28},
+                },
+            ],
+        },
+    };
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    irl: {
+        mapFigure: function (values, frame, geometry, template, frames) {
+            // Build the map figure from the region geometry, which is only
+            // sent to the browser again when the map is zoomed or panned
+            // out of its view, and the per region values for the selected
+            // date and dropdown value, or the current frame while the map
+            // is being played back
+            if (frames && frame !== null && frame !== undefined) {
+                values = {
+                    z: frames.z[frame],
+                    range: frames.range,
+                    label: frames.label,
+                    title: frames.title + " " + frames.dates[frame],
+                };
+            }
+
+            if (!values || !geometry) {
+                return noDataGraph();
+            }
+
+            return {
+                data: [
+                    {
+                        type: "choroplethmapbox",
+                        geojson: geometry.geojson,
+                        featureidkey: geometry.featureidkey,
+                        locations: geometry.locations,
+                        z: values.z,
+                        coloraxis: "coloraxis",
+                        hovertemplate:
+                            geometry.region +
+                            "=%{location}<br>" +
+                            values.label +
+                            "=%{z}<extra></extra>",
+                    },
+                ],
+                layout: {
+                    template: template,
+                    title: {text: values.title},
+                    margin: {l: 0, r: 0, t: 50, b: 50},
+                    mapbox: {
+                        style: "carto-positron",
+                        center: geometry.center,
+                        zoom: geometry.zoom,
+                    },
+                    // Keep the user's zoom and position when the figure is
+                    // rebuilt
+                    uirevision: "map",
+                    coloraxis: {
+                        cmin: values.range[0],
+                        cmax: values.range[1],
+                        colorscale: geometry.colorscale,
+                        colorbar: {title: {text: values.label}},
+                    },
+                },
+            };
+        },
+
+        sliderLabel: function (value, range, mode) {
+            // Let the user know what date, or range of dates, was selected,
+            // the slider values are unix timestamps in seconds
+            const pad = (n) => String(n).padStart(2, "0");
+            const format = (seconds) => {
+                const date = new Date(seconds * 1000);
+                return pad(date.getUTCMonth() + 1) + "/" + pad(date.getUTCDate());
+            };
+
+            if (mode === "range") {
+                return "Dates Selected: " + format(range[0]) + " - " + format(range[1]);
+            }
+            return "Date Selected: " + format(value);
+        },
+
+        sliderMode: function (mode) {
+            // Show the slider of the selected map mode and hide the other
+            const show = {}, hide = {display: "none"};
+            return mode === "range" ? [hide, show] : [show, hide];
+        },
+
+        playback: function (n_intervals, frames) {
+            // Return the frame to show for the current tick of the playback
+            // interval and whether the interval should stop, playback ends
+            // after the last frame and the map goes back to the slider
+            if (!frames) {
+                return [null, true];
+            }
+            const frame = (n_intervals || 0) - frames.start;
+            if (frame < frames.z.length) {
+                return [frame, false];
+            }
+            return [null, true];
+        },
+
+        totalsFigure: function (dropdown, figures, template) {
+            // Switch between the total figures that were built once on the
+            // server and sent to the browser with the page
+            const figure = figures[dropdown];
+            return {
+                data: figure.data,
+                layout: Object.assign({}, figure.layout, {template: template}),
+            };
+        },
+    },
+});
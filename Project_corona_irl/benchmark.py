@@ -0,0 +1,469 @@
+"""
+Benchmarks of the dashboard, run against a copy of the bundled datasets
+or a synthetic history of any length and number of regions, e.g.
+
+    python benchmark.py
+    python benchmark.py --days 1825 --regions 26 --save baseline.json
+    python benchmark.py --days 1825 --regions 26 --baseline baseline.json
+
+times:
+
+    startup - importing the app and creating it in a new process
+    load_cold, load_warm - reading the datasets without and with the
+        parsed column cache
+    derive - building a snapshot with the derived metrics from the
+        parsed datasets
+    callback.<name> - each server side callback for every input combination
+        (or --sample dates of them), in process through the flask test
+        client with the callback results and map values not cached
+    load.<name> - latency and throughput of concurrent requests against a
+        local server, with the caches as configured by default
+
+With --baseline the results are compared to a file saved with --save and
+the script exits with an error if any is slower by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import ireland_dash
+from breakdowns import breakdowns
+from columncache import cacheDir
+from datastore import Snapshot
+from fetch import loadDatasets
+from figures import map_options
+from regions import syntheticRegions
+
+rootdir = os.path.dirname(os.path.abspath(__file__))
+county_csv = "Covid19CountyStatisticsHPSCIreland.csv"
+ireland_csv = "CovidStatisticsProfileHPSCIrelandOpenData.csv"
+
+
+def syntheticData(directory, days, regions, seed=0):
+    """
+    Function to write a synthetic history of days days and regions regions
+    to directory in the format of the bundled datasets. The bundled rows
+    are used as templates and the cases are random daily counts. With more
+    than the 26 counties the regions are named "Region <n>" and their
+    synthetic outlines are written to regions.json.
+    """
+    rng = np.random.default_rng(seed)
+    county = pd.read_csv(os.path.join(rootdir, "data", county_csv))
+    ireland = pd.read_csv(os.path.join(rootdir, "data", ireland_csv))
+
+    # One template row per region, repeated for every day
+    templates = county.drop_duplicates("CountyName").reset_index(drop=True)
+    templates = templates.iloc[np.arange(regions) % len(templates)].reset_index(
+        drop=True
+    )
+    if regions > len(county["CountyName"].unique()):
+        templates["CountyName"] = ["Region %i" % i for i in range(regions)]
+        with open(os.path.join(directory, "regions.json"), "w") as myfile:
+            json.dump(syntheticRegions(regions), myfile)
+    dates = pd.date_range("2020-02-27", periods=days)
+
+    daily = rng.poisson(rng.uniform(1, 20, regions), size=(days, regions))
+    cases = daily.cumsum(axis=0)
+    df_county = pd.concat([templates] * days, ignore_index=True)
+    df_county["OBJECTID"] = np.arange(len(df_county))
+    df_county["TimeStamp"] = np.repeat(dates.strftime("%Y/%m/%d 00:00:00+00"), regions)
+    df_county["ConfirmedCovidCases"] = cases.ravel()
+    df_county["PopulationProportionCovidCases"] = (
+        cases.ravel() / df_county["PopulationCensus16"] * 100000
+    ).round(1)
+    df_county.to_csv(os.path.join(directory, county_csv), index=False)
+
+    # The national breakdowns are the latest bundled ones scaled to the
+    # total number of cases
+    template = ireland.iloc[-1]
+    scale = cases.sum(axis=1) / template["TotalConfirmedCovidCases"]
+    df_ireland = pd.DataFrame([template] * days).reset_index(drop=True)
+    numeric = [
+        column
+        for column in ireland.columns
+        if column not in ("X", "Y", "FID", "Median_Age")
+        and pd.api.types.is_numeric_dtype(ireland[column])
+    ]
+    df_ireland[numeric] = (
+        df_ireland[numeric].astype(float).mul(scale, axis=0).round().values
+    )
+    df_ireland["Date"] = dates.strftime("%Y/%m/%d 00:00:00+00")
+    df_ireland["StatisticsProfileDate"] = (dates - pd.Timedelta(days=2)).strftime(
+        "%Y/%m/%d 00:00:00+00"
+    )
+    df_ireland["ConfirmedCovidCases"] = daily.sum(axis=1)
+    df_ireland["TotalConfirmedCovidCases"] = cases.sum(axis=1)
+    df_ireland["FID"] = np.arange(days)
+    df_ireland.to_csv(os.path.join(directory, ireland_csv), index=False)
+
+
+def benchmarkEnviron(directory):
+    """
+    Function to return the environment variables of the app under
+    benchmark, reading the datasets from directory without trying to
+    download them
+    """
+    geojson = os.path.join(directory, "regions.json")
+    if not os.path.exists(geojson):
+        geojson = os.path.join(rootdir, "data", "ireland.json")
+    return {
+        "DATA_URL": "http://127.0.0.1:1/",
+        "DATA_DIR": directory,
+        "GEOJSON_PATH": geojson,
+        "REFRESH_INTERVAL": "0",
+        "METRICS": "0",
+    }
+
+
+def timeit(function, repeat=1):
+    """Function to return the fastest of repeat timings of function in seconds"""
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def percentiles(timings):
+    """Function to summarise a list of timings in seconds"""
+    timings = np.asarray(timings)
+    return {
+        "p50": float(np.percentile(timings, 50)),
+        "p99": float(np.percentile(timings, 99)),
+        "count": len(timings),
+    }
+
+
+def benchmarkStartup(directory, repeat):
+    """Function to time importing and creating the app in a new process"""
+    env = dict(os.environ, **benchmarkEnviron(directory))
+    code = "import ireland_dash; ireland_dash.create_app()"
+    return timeit(
+        lambda: subprocess.run(
+            [sys.executable, "-c", code], cwd=rootdir, env=env, check=True
+        ),
+        repeat,
+    )
+
+
+def benchmarkData(config, repeat):
+    """Function to time loading the datasets and deriving the snapshot"""
+    sources = ireland_dash.dataSources(config)
+    fetcher = ireland_dash.dataFetcher(config)
+
+    def cold():
+        for online, local, dates in sources:
+            shutil.rmtree(cacheDir(local), ignore_errors=True)
+        loadDatasets(sources, fetcher)
+
+    loaded = []
+    results = {
+        "load_cold": timeit(cold, repeat),
+        "load_warm": timeit(
+            lambda: loaded.append(loadDatasets(sources, fetcher)), repeat
+        ),
+    }
+    loaded_county, loaded_ireland = loaded[-1]
+    results["derive"] = timeit(
+        lambda: Snapshot(
+            loaded_county.df,
+            loaded_ireland.df,
+            1,
+            active_window=config["ACTIVE_CASE_WINDOW"],
+        ),
+        repeat,
+    )
+    return results
+
+
+def callbackBody(output, inputs, state=()):
+    """
+    Function to return the body of a dash callback request, inputs and
+    state being lists of (id, property, value) in the order the callback
+    declares them. The first input is the one that changed. A callback
+    with several outputs is given a list of them.
+    """
+
+    def values(items):
+        return [
+            {"id": component, "property": prop, "value": value}
+            for component, prop, value in items
+        ]
+
+    def target(output):
+        component, prop = output.split(".")
+        return {"id": component, "property": prop}
+
+    if isinstance(output, list):
+        outputs = [target(item) for item in output]
+        output = "..%s.." % "...".join(output)
+    else:
+        outputs = target(output)
+
+    return {
+        "output": output,
+        "outputs": outputs,
+        "inputs": values(inputs),
+        "state": values(state),
+        "changedPropIds": ["%s.%s" % inputs[0][:2]],
+    }
+
+
+def callbackRequests(data, sample):
+    """
+    Function to return the requests of every server side callback for
+    every input combination as {callback: [body, ...]}, for sample dates
+    spread over the history if sample is given
+    """
+    dates = [ireland_dash.unixTimeMillis(date) for date in data.daterange]
+    if sample and sample < len(dates):
+        dates = [dates[i] for i in np.linspace(0, len(dates) - 1, sample).astype(int)]
+    week = 7 * 86400
+
+    bodies = {"update_map_figure": [], "update_breakdown_figure": []}
+    for date in dates:
+        for dropdown in map_options:
+            for mode in ("day", "range"):
+                bodies["update_map_figure"].append(
+                    callbackBody(
+                        "map-values.data",
+                        [
+                            ("map-slider", "value", date),
+                            ("map-dropdown", "value", dropdown),
+                            ("map-mode", "value", mode),
+                            ("map-range-slider", "value", [date - week, date]),
+                        ],
+                    )
+                )
+        for dropdown in breakdowns:
+            bodies["update_breakdown_figure"].append(
+                callbackBody(
+                    "irl-breakdown.figure",
+                    [
+                        ("breakdown-dropdown", "value", dropdown),
+                        ("map-slider", "value", date),
+                    ],
+                )
+            )
+
+    # Zooming in on the middle of the map, and panning across it at the
+    # closest zoom
+    bodies["update_map_geometry"] = [
+        callbackBody(
+            ["map-geometry.data", "map-view.data"],
+            [
+                (
+                    "irl-map",
+                    "relayoutData",
+                    {"mapbox.zoom": zoom, "mapbox.center": {"lat": 53.45, "lon": lon}},
+                )
+            ],
+            [("map-view", "data", None)],
+        )
+        for zoom in range(5, 11)
+        for lon in ([-8] if zoom < 10 else np.linspace(-10, -6, 10).tolist())
+    ]
+    bodies["update_map_frames"] = [
+        callbackBody(
+            "map-frames.data",
+            [("map-play", "n_clicks", 1)],
+            [("map-dropdown", "value", dropdown), ("map-interval", "n_intervals", 0)],
+        )
+        for dropdown in map_options
+    ]
+    return bodies
+
+
+def benchmarkCallbacks(config, sample):
+    """
+    Function to time each callback request through the flask test client,
+    with the callback results and map values not cached so every request
+    builds its result
+    """
+    app = ireland_dash.create_app(dict(config, CALLBACK_CACHE="none", MAP_CACHE_SIZE=0))
+    client = app.server.test_client()
+    client.get("/")
+    data = app.refresher.get()
+
+    results = {}
+    for name, bodies in callbackRequests(data, sample).items():
+        timings = []
+        for body in bodies:
+            start = time.perf_counter()
+            response = client.post("/_dash-update-component", json=body)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code in (200, 204), response.data[:200]
+        results["callback." + name] = percentiles(timings)
+    return results
+
+
+class QuietHandler(WSGIRequestHandler):
+    """Request handler of the load test server which doesn't log each request"""
+
+    def log_request(self, *args):
+        pass
+
+
+def benchmarkLoad(config, sample, concurrency, count):
+    """
+    Function to run a local server and send it requests from concurrency
+    threads, a random mix of the page layout and the callback requests.
+    Returns the latency percentiles and throughput of each request type.
+    """
+    app = ireland_dash.create_app(config)
+    server = make_server(
+        "127.0.0.1", 0, app.server, threaded=True, request_handler=QuietHandler
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = "http://127.0.0.1:%i" % server.server_port
+
+    bodies = callbackRequests(app.refresher.get(), sample)
+    jobs = [("layout", None)] + [
+        (name, body) for name, items in bodies.items() for body in items
+    ]
+    rng = random.Random(0)
+    jobs = [rng.choice(jobs) for i in range(count)]
+
+    local = threading.local()
+
+    def send(job):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        name, body = job
+        start = time.perf_counter()
+        if body is None:
+            response = local.session.get(url + "/_dash-layout")
+        else:
+            response = local.session.post(url + "/_dash-update-component", json=body)
+        response.raise_for_status()
+        return name, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        timings = list(pool.map(send, jobs))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    results = {}
+    for name in sorted(set(name for name, timing in timings)):
+        results["load." + name] = percentiles(
+            [timing for job, timing in timings if job == name]
+        )
+    results["load.all"] = dict(
+        percentiles([timing for job, timing in timings]),
+        throughput=len(timings) / elapsed,
+    )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Function to print each result next to its baseline, returning the
+    names of the results slower than the baseline by more than tolerance
+    """
+    slower = []
+    for name, result in results.items():
+        # Results are either a time in seconds or a dict of statistics
+        old = baseline.get(name)
+        if not isinstance(result, dict):
+            result, old = {"seconds": result}, {"seconds": old}
+        for key, value in result.items():
+            if key == "count":
+                continue
+            before = (old or {}).get(key)
+            if not before:
+                print("%-40s %-10s %10.4f" % (name, key, value))
+                continue
+
+            # Throughput is better when higher, everything else when lower
+            change = before / value if key == "throughput" else value / before
+            flag = "SLOWER" if change > 1 + tolerance else ""
+            print(
+                "%-40s %-10s %10.4f %10.4f %+7.1f%% %s"
+                % (name, key, value, before, (change - 1) * 100, flag)
+            )
+            if flag:
+                slower.append("%s %s" % (name, key))
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard")
+    parser.add_argument(
+        "--days", type=int, help="days of synthetic history, the bundled data if unset"
+    )
+    parser.add_argument(
+        "--regions", type=int, default=26, help="regions of the synthetic history"
+    )
+    parser.add_argument(
+        "--sample", type=int, default=30, help="dates timed per callback, 0 for all"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="repeats of the timings")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="threads of the load generator"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=500, help="requests sent by the load generator"
+    )
+    parser.add_argument("--baseline", help="json file of results to compare against")
+    parser.add_argument("--save", help="json file to save the results to")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="fraction a result may be slower than the baseline",
+    )
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        if args.days:
+            syntheticData(directory, args.days, args.regions)
+            print("Benchmarking %i days x %i regions" % (args.days, args.regions))
+        else:
+            for name in (county_csv, ireland_csv):
+                shutil.copy(os.path.join(rootdir, "data", name), directory)
+            print("Benchmarking the bundled datasets")
+
+        # The app reads its config from the environment, see defaultConfig
+        os.environ.update(benchmarkEnviron(directory))
+        config = ireland_dash.defaultConfig()
+        results = {"startup": benchmarkStartup(directory, args.repeat)}
+        results.update(benchmarkData(config, args.repeat))
+        results.update(benchmarkCallbacks(config, args.sample))
+        results.update(
+            benchmarkLoad(config, args.sample, args.concurrency, args.requests)
+        )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as myfile:
+            baseline = json.load(myfile)
+    slower = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.save, "w") as myfile:
+            json.dump(results, myfile, indent=1, sort_keys=True)
+
+    if slower:
+        print("Slower than the baseline: %s" % ", ".join(slower))
+        sys.exit(1)
@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+import numpy as np
+
+# A breakdown of the national statistics shown on the breakdown figure:
+#
+# label - name of the breakdown in the dropdown
+# title - title of the figure
+# labels - label of each bar
+# columns - national table column of each bar
+# denominators - if given each bar is columns / denominators * scale
+#     rounded to decimals places, otherwise the columns are shown as they are
+Breakdown = namedtuple(
+    "Breakdown",
+    ["label", "title", "labels", "columns", "denominators", "scale", "decimals"],
+    defaults=[None, 1, None],
+)
+
+# Hospitalised and confirmed case columns of each age group used for the
+# likelihood of hospitalisation, the youngest hospitalised group in the
+# dataset is compared against the 1-4 cases group
+hospital_age_groups = [
+    ("HospitalisedAged5", "Aged1to4"),
+    ("HospitalisedAged5to14", "Aged5to14"),
+    ("HospitalisedAged15to24", "Aged15to24"),
+    ("HospitalisedAged25to34", "Aged25to34"),
+    ("HospitalisedAged35to44", "Aged35to44"),
+    ("HospitalisedAged45to54", "Aged45to54"),
+    ("HospitalisedAged55to64", "Aged55to64"),
+    ("HospitalisedAged65up", "Aged65up"),
+]
+
+hospital_age_labels = [
+    "Aged 1-4",
+    "Aged 5-14",
+    "Aged 15-24",
+    "Aged 25-34",
+    "Aged 35-44",
+    "Aged 45-54",
+    "Aged 55-64",
+    "Aged 65+",
+]
+
+# Every breakdown in the order shown in the dropdown, adding an entry here
+# is all that's needed for a new breakdown
+breakdowns = {
+    "transmission": Breakdown(
+        "Transmission",
+        "% Known Mode of Transmission",
+        ["Community", "Close Contact", "Travel Abroad"],
+        ["CommunityTransmission", "CloseContact", "TravelAbroad"],
+    ),
+    "gender": Breakdown(
+        "Gender", "Gender", ["Male", "Female", "Unknown"], ["Male", "Female", "Unknown"]
+    ),
+    "caseAge": Breakdown(
+        "Cases Age Profile",
+        "Case Age Profile",
+        ["Aged >1", "Aged 1-4", "Aged 5-14", "Aged 15-24", "Aged 25-34"]
+        + ["Aged 35-44", "Aged 45-54", "Aged 55-64", "Aged 65+"],
+        ["Aged1", "Aged1to4", "Aged5to14", "Aged15to24", "Aged25to34"]
+        + ["Aged35to44", "Aged45to54", "Aged55to64", "Aged65up"],
+    ),
+    "hospitalAge": Breakdown(
+        "Hospitalization Age Profile",
+        "Hospitalization Age Profile",
+        hospital_age_labels,
+        [hospitalised for hospitalised, cases in hospital_age_groups],
+    ),
+    "hospitalOdds": Breakdown(
+        "Likelihood of Hospitalization",
+        "% Likelihood of Hospitalization by Age",
+        hospital_age_labels,
+        [hospitalised for hospitalised, cases in hospital_age_groups],
+        denominators=[cases for hospitalised, cases in hospital_age_groups],
+        scale=100,
+        decimals=2,
+    ),
+}
+
+
+def breakdownValues(ireland_store, name, date):
+    """
+    Return the values of a breakdown on a given date as an array, one row
+    slice of the store's matrix, or None if there is no data for the date
+    """
+    row = ireland_store.row(date)
+    if row is None:
+        return None
+
+    breakdown = breakdowns[name]
+    values = row[ireland_store.indices(breakdown.columns)]
+    if breakdown.denominators is not None:
+        values = values / row[ireland_store.indices(breakdown.denominators)]
+        values = values * breakdown.scale
+        if breakdown.decimals is not None:
+            values = np.round(values, breakdown.decimals)
+
+    return values
@@ -0,0 +1,257 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread safe least recently used cache. Once the cache holds maxsize
+    entries the entry that was used longest ago is evicted to make room,
+    and with a ttl entries expire ttl seconds after they were added.
+
+    Keys are tuples whose first element is the version of the data the
+    entry was built from, so invalidate can drop the entries of older
+    versions once new data is loaded.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return the cached value for key, marking it as recently used"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[0] is not None and entry[0] < time.time()):
+                self._data.pop(key, None)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Add a value to the cache, evicting the oldest entry if full"""
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def getOrBuild(self, key, builder, *args):
+        """
+        Return the cached value for key or call builder(*args) to build,
+        cache and return it. The builder is called outside of the lock so
+        a slow build does not block readers of other keys.
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = builder(*args)
+            self.set(key, value)
+        return value
+
+    def invalidate(self, version):
+        """Remove the entries built from data older than version"""
+        with self._lock:
+            for key in [key for key in self._data if key[0] < version]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return the number of entries, hits and misses of the cache"""
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class FileCache:
+    """
+    Cache of pickled values in a directory, which can be shared by several
+    worker processes. It has the same interface as LRUCache.
+
+    Each entry is written to <version>/<hash of key>.pickle, the version
+    being the first element of the key as for LRUCache, so invalidate
+    only needs to remove the directories of older versions. Files are
+    written to a temporary name and renamed so readers never see a partly
+    written entry. Using an entry updates its modification time and once
+    the cache holds more than maxsize entries the least recently used are
+    removed. The hit and miss counts are those of this process.
+    """
+
+    def __init__(self, directory, maxsize=1024, ttl=None):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, str(key[0]), digest + ".pickle")
+
+    def _files(self):
+        """Return the paths of every entry in the cache"""
+        return [
+            entry.path
+            for version in os.scandir(self.directory)
+            if version.is_dir()
+            for entry in os.scandir(version.path)
+            if entry.name.endswith(".pickle")
+        ]
+
+    def __len__(self):
+        return len(self._files())
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, default=None):
+        """Return the cached value for key, marking it as recently used"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as myfile:
+                expires, value = pickle.load(myfile)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self._count(False)
+            return default
+
+        if expires is not None and expires < time.time():
+            self._remove(path)
+            self._count(False)
+            return default
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count(True)
+        return value
+
+    def set(self, key, value):
+        """Add a value to the cache, evicting the oldest entries if full"""
+        expires = time.time() + self.ttl if self.ttl else None
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        temp = "%s.%i.%i.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(temp, "wb") as myfile:
+            pickle.dump((expires, value), myfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used entries beyond maxsize"""
+        files = self._files()
+        if len(files) <= self.maxsize:
+            return
+
+        def mtime(path):
+            try:
+                return os.stat(path).st_mtime
+            except OSError:
+                return 0
+
+        for path in sorted(files, key=mtime)[: len(files) - self.maxsize]:
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    getOrBuild = LRUCache.getOrBuild
+
+    def invalidate(self, version):
+        """Remove the entries built from data older than version"""
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and entry.name.isdigit() and int(entry.name) < version:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def stats(self):
+        """Return the number of entries, hits and misses of the cache"""
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
+
+
+class CallbackCache:
+    """
+    Cache of the results of callbacks which are pure functions of their
+    inputs and the data snapshot, stored in a backend such as LRUCache or
+    FileCache, or not stored at all if the backend is None.
+
+    current is a function returning the current snapshot. A memoised
+    callback is passed the snapshot before its inputs and its results are
+    keyed by (data version, callback name, inputs), so results are shared
+    by every user and a new snapshot is never served results built from
+    an older one. The backend's entries for older versions are dropped
+    the first time a new version is seen.
+    """
+
+    def __init__(self, backend, current):
+        self.backend = backend
+        self.current = current
+        self.version = None
+
+    def memoize(self, function):
+        """Decorator caching the results of a callback"""
+        name = function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            data = self.current()
+            if self.backend is None:
+                return function(data, *args)
+
+            if data.version != self.version:
+                self.version = data.version
+                self.backend.invalidate(data.version)
+
+            # The inputs are json data from the browser, which may be
+            # lists or dicts, so they are keyed by their json text
+            key = (data.version, name, json.dumps(args, sort_keys=True))
+            return self.backend.getOrBuild(key, function, data, *args)
+
+        return wrapper
+
+    def stats(self):
+        """Return the backend's number of entries, hits and misses"""
+        if self.backend is None:
+            return {"size": 0, "hits": 0, "misses": 0}
+        return self.backend.stats()
+
+
+# Sentinel used to tell a cached None apart from a cache miss
+_missing = object()
@@ -0,0 +1,269 @@
+"""
+Checks of the incremental ingest on a synthetic history, e.g.
+
+    python check_ingest.py
+    python check_ingest.py --days 365 --regions 100
+
+checks that:
+
+    new rows - the backward scan of a csv for the rows after a date finds
+        the same rows as reading the whole csv, with either line ending
+        and with or without a newline at the end
+    append - snapshots grown by appending the new rows of each day, or of
+        several days at once, match snapshots loaded in full from the same
+        csv: the national table and matrix, the county arrays and maxima
+        and the prefix sums. Every snapshot is compared after the last
+        append, so appending can't have changed the older ones.
+    ranges - the county cases and national totals of windows of dates,
+        from the prefix sums, match the sums of the rows in each window
+
+Some county rows are dropped at random so the gaps are filled across the
+appends. The script exits with an error if any check fails.
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from benchmark import county_csv, ireland_csv, syntheticData
+from columncache import typeColumns
+from datastore import Snapshot, toDay
+from ingest import loadNewRows, newRows
+
+county_dates = ["TimeStamp"]
+ireland_dates = ["Date", "StatisticsProfileDate"]
+
+
+def syntheticCsvs(directory, days, regions, seed=0):
+    """
+    Function to return the text of a synthetic county and national csv,
+    with a tenth of the county rows dropped
+    """
+    syntheticData(directory, days, regions, seed)
+    county = pd.read_csv(os.path.join(directory, county_csv))
+    keep = np.random.default_rng(seed).random(len(county)) > 0.1
+    county = county[keep]
+    with open(os.path.join(directory, ireland_csv)) as myfile:
+        ireland = myfile.read()
+    return county.to_csv(index=False), ireland
+
+
+def truncate(text, column, last):
+    """Function to return a csv with only its rows dated up to last"""
+    lines = text.splitlines(keepends=True)
+    position = lines[0].rstrip("\r\n").split(",").index(column)
+    rows = [line for line in lines[1:] if line.split(",")[position][:10] <= last]
+    return lines[0] + "".join(rows)
+
+
+def csvDates(text, column):
+    """Function to return the distinct 'yyyy/mm/dd' dates of a csv's column"""
+    return sorted(pd.read_csv(io.StringIO(text))[column].str.slice(0, 10).unique())
+
+
+def sameArrays(a, b):
+    """Function to return whether two arrays are equal, nans included"""
+    a, b = np.asarray(a), np.asarray(b)
+    if a.shape != b.shape:
+        return False
+    if a.dtype.kind == "f" or b.dtype.kind == "f":
+        return np.allclose(a, b, rtol=1e-12, atol=1e-9, equal_nan=True)
+    return np.array_equal(a, b)
+
+
+def snapshotDifferences(snapshot, expected):
+    """Function to return the parts of a snapshot which differ from expected"""
+    differences = []
+    try:
+        pd.testing.assert_frame_equal(
+            snapshot.df_ireland,
+            expected.df_ireland,
+            check_dtype=False,
+            check_categorical=False,
+        )
+    except AssertionError:
+        differences.append("df_ireland")
+
+    county, expected_county = snapshot.county_store, expected.county_store
+    if not sameArrays(county.counties, expected_county.counties):
+        differences.append("counties")
+    if not sameArrays(county.dates, expected_county.dates):
+        differences.append("county dates")
+    for metric, values in expected_county.values.items():
+        if not sameArrays(county.values[metric], values):
+            differences.append("county %s" % metric)
+        if not sameArrays(county.max(metric), expected_county.max(metric)):
+            differences.append("county max %s" % metric)
+
+    ireland, expected_ireland = snapshot.ireland_store, expected.ireland_store
+    if ireland.columns != expected_ireland.columns:
+        differences.append("national columns")
+    if not sameArrays(ireland.matrix, expected_ireland.matrix):
+        differences.append("national matrix")
+    if not sameArrays(ireland.dates, expected_ireland.dates):
+        differences.append("national dates")
+    if any(
+        not sameArrays(ireland.row(date), expected_ireland.row(date))
+        for date in expected_ireland.dates
+    ):
+        differences.append("national rows")
+
+    ranges, expected_ranges = snapshot.ranges, expected.ranges
+    for name in ("county_sums", "national_sums", "population"):
+        if not sameArrays(getattr(ranges, name), getattr(expected_ranges, name)):
+            differences.append(name)
+    return differences
+
+
+def checkNewRows(county, ireland):
+    """Function to check the backward scan finds the rows after a date"""
+    failures = []
+    for text, column in [(county, "TimeStamp"), (ireland, "Date")]:
+        dates = csvDates(text, column)
+        lasts = ["2000/01/01", dates[0], dates[len(dates) // 2], dates[-2], dates[-1]]
+        variants = {
+            "lf": text,
+            "crlf": text.replace("\n", "\r\n"),
+            "no final newline": text.rstrip("\n"),
+        }
+        for variant, variant_text in variants.items():
+            full = pd.read_csv(io.StringIO(variant_text))
+            for last in lasts:
+                expected = full[full[column].str.slice(0, 10) > last]
+                found = newRows(variant_text, last, column)
+                if not sameArrays(
+                    found.values.astype(str), expected.values.astype(str)
+                ):
+                    failures.append("%s, %s, after %s" % (column, variant, last))
+    return failures
+
+
+def fullSnapshot(county, ireland, version):
+    """Function to load a snapshot from the whole of the csvs"""
+    return Snapshot(
+        typeColumns(pd.read_csv(io.StringIO(county)), county_dates),
+        typeColumns(pd.read_csv(io.StringIO(ireland)), ireland_dates),
+        version,
+    )
+
+
+def checkAppend(county, ireland, directory):
+    """
+    Function to check snapshots grown by appending the rows of later
+    versions of the csvs match snapshots loaded in full from them
+    """
+    dates = csvDates(ireland, "Date")
+    half = len(dates) // 2
+
+    # A day at a time, then a few days at once, then the rest
+    cuts = [dates[i] for i in (half, half + 1, half + 2, half + 9, len(dates) - 1)]
+    county_path = os.path.join(directory, "county.csv")
+    ireland_path = os.path.join(directory, "ireland.csv")
+
+    snapshots = []
+    for version, cut in enumerate(cuts):
+        county_text = truncate(county, "TimeStamp", cut)
+        ireland_text = truncate(ireland, "Date", cut)
+        if not snapshots:
+            snapshots.append(fullSnapshot(county_text, ireland_text, version))
+            continue
+
+        # Read the new rows the way the app does, from the local copies
+        with open(county_path, "w") as myfile:
+            myfile.write(county_text)
+        with open(ireland_path, "w") as myfile:
+            myfile.write(ireland_text)
+        county_last, ireland_last = snapshots[-1].lastDates()
+        county_rows = loadNewRows(
+            None, county_path, county_dates, None, county_last, "TimeStamp"
+        ).df
+        ireland_rows = loadNewRows(
+            None, ireland_path, ireland_dates, None, ireland_last, "Date"
+        ).df
+        snapshots.append(snapshots[-1].append(county_rows, ireland_rows, version))
+
+    failures = []
+    for version, (cut, snapshot) in enumerate(zip(cuts, snapshots)):
+        expected = fullSnapshot(
+            truncate(county, "TimeStamp", cut), truncate(ireland, "Date", cut), version
+        )
+        differences = snapshotDifferences(snapshot, expected)
+        if differences:
+            failures.append("up to %s: %s" % (cut, ", ".join(differences)))
+    return failures
+
+
+def checkRanges(county, ireland, windows=50, seed=0):
+    """
+    Function to check the totals of windows of dates from the prefix sums
+    against the sums of the rows in each window
+    """
+    snapshot = fullSnapshot(county, ireland, 0)
+    df_county = typeColumns(pd.read_csv(io.StringIO(county)), county_dates)
+    df_ireland = snapshot.df_ireland
+
+    # Running total of each county's cases on each date it has an entry
+    day = df_county["TimeStamp"].values.astype("datetime64[D]")
+    names = df_county["CountyName"].astype(str).values
+    cases = df_county["ConfirmedCovidCases"].values
+
+    def countyTotal(county_name, date):
+        """The running total of a county on the last entry up to date"""
+        mask = (names == county_name) & (day <= date)
+        return cases[mask][np.argmax(day[mask])] if mask.any() else 0
+
+    rng = np.random.default_rng(seed)
+    dates = snapshot.county_store.dates
+    failures = []
+    for i in range(windows):
+        start, end = np.sort(rng.choice(dates, 2))
+        start = start - np.timedelta64(int(rng.integers(0, 3)), "D")
+
+        expected = [
+            countyTotal(name, end) - countyTotal(name, start - np.timedelta64(1, "D"))
+            for name in snapshot.ranges.counties
+        ]
+        if not sameArrays(snapshot.ranges.countyCases(start, end), expected):
+            failures.append("county cases %s to %s" % (start, end))
+
+        national_days = df_ireland["Date"].values.astype("datetime64[D]")
+        window = (national_days >= toDay(start)) & (national_days <= toDay(end))
+        totals = snapshot.ranges.nationalTotals(start, end)
+        for metric in snapshot.ranges.national:
+            expected = np.nansum(df_ireland[metric].values[window])
+            if not sameArrays(totals[metric], expected):
+                failures.append("national %s %s to %s" % (metric, start, end))
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the incremental ingest against full loads"
+    )
+    parser.add_argument("--days", type=int, default=120, help="days of history")
+    parser.add_argument("--regions", type=int, default=26, help="number of regions")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="check-ingest-")
+    try:
+        county, ireland = syntheticCsvs(directory, args.days, args.regions)
+        checks = {
+            "new rows": checkNewRows(county, ireland),
+            "append": checkAppend(county, ireland, directory),
+            "ranges": checkRanges(county, ireland),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    failed = False
+    for name, failures in checks.items():
+        print("%s: %s" % (name, "; ".join(failures) or "ok"))
+        failed = failed or bool(failures)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from datastore import parseDate
+
+# Changing the format of the cache must change this to invalidate it
+version = 2
+
+
+def fileKey(path):
+    """Return a key identifying the current version of a file by its size and mtime"""
+    stat = os.stat(path)
+    return "%i-%i" % (stat.st_size, stat.st_mtime_ns)
+
+
+def cacheDir(local):
+    """Return the cache directory for a local dataset, data/cache/<name>"""
+    name = os.path.splitext(os.path.basename(local))[0]
+    return os.path.join(os.path.dirname(local), "cache", name)
+
+
+def typeColumns(df, dates=()):
+    """
+    Return df with the given date columns parsed and every other text
+    column made categorical, the types the columns are cached with
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column in dates:
+            df[column] = parseDate(df[column])
+        elif df[column].dtype == object:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def writeArray(directory, name, array):
+    """Write an array to directory/name.npy and return the file name"""
+    filename = name + ".npy"
+    np.save(os.path.join(directory, filename), np.asarray(array), allow_pickle=False)
+    return filename
+
+
+def readArray(directory, filename):
+    """Memory map a read only array written by writeArray"""
+    return np.load(os.path.join(directory, filename), mmap_mode="r")
+
+
+def writeFrame(df, directory, name):
+    """
+    Write a dataframe to directory with its numeric and date columns
+    grouped by dtype, one 2D array per dtype, and its text columns as
+    categorical codes. Returns the entries describing the arrays.
+    """
+    groups = {}
+    entries = []
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == object:
+            series = series.astype("category")
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            filename = "%s-%i" % (name, len(entries))
+            entries.append(
+                {
+                    "file": writeArray(directory, filename, series.cat.codes.values),
+                    "columns": [column],
+                    "categories": series.cat.categories.tolist(),
+                }
+            )
+        else:
+            groups.setdefault(series.dtype.str, []).append(column)
+
+    for columns in groups.values():
+        filename = "%s-%i" % (name, len(entries))
+        array = np.ascontiguousarray(df[columns].values)
+        entries.append(
+            {"file": writeArray(directory, filename, array), "columns": columns}
+        )
+    return entries
+
+
+def readFrame(directory, entries):
+    """
+    Read a dataframe written by writeFrame. Each dtype's array is memory
+    mapped and wrapped by the dataframe without a copy, so the columns are
+    grouped by dtype rather than in the order they were written in.
+    """
+    frames = []
+    for entry in entries:
+        array = readArray(directory, entry["file"])
+        if "categories" in entry:
+            (column,) = entry["columns"]
+            categorical = pd.Categorical.from_codes(array, entry["categories"])
+            frames.append(pd.DataFrame({column: categorical}))
+        else:
+            frames.append(pd.DataFrame(array, columns=entry["columns"]))
+    return pd.concat(frames, axis=1, copy=False)
+
+
+def writeColumns(df, directory, key):
+    """
+    Write a typed dataframe to directory with writeFrame, with a meta.json
+    describing the arrays and the key of the source it was parsed from.
+    The old cache is removed first and meta.json is written last so a
+    partly written cache is never read. Removing the old files rather than
+    overwriting them leaves any process still mapping them unaffected.
+    """
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    entries = writeFrame(df, directory, "columns")
+
+    meta_path = os.path.join(directory, "meta.json")
+    with open(meta_path + ".tmp", "w") as myfile:
+        json.dump({"version": version, "key": key, "columns": entries}, myfile)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def readColumns(directory, key):
+    """
+    Read a cached dataframe from directory with readFrame, so its columns
+    are views of the memory mapped arrays. Returns None if there is no
+    cache, it is of an older format or it was written for a different
+    key, i.e. the source has changed since.
+    """
+    try:
+        with open(os.path.join(directory, "meta.json")) as myfile:
+            meta = json.load(myfile)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get("version") != version or meta["key"] != key:
+        return None
+    return readFrame(directory, meta["columns"])
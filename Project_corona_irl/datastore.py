@@ -0,0 +1,689 @@
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def parseDate(series):
+    """
+    Parse the 'yyyy/mm/dd hh:mm:ss+00' dates provided by the dataset into
+    pandas datetimes, only the date part is kept as every entry is midnight.
+    Columns that are already parsed are returned as they are.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series.str.slice(0, 10), format="%Y/%m/%d")
+
+
+def parseTimeStamp(series):
+    """Parse the dates provided by the dataset into numpy day precision dates"""
+    return parseDate(series).values.astype("datetime64[D]")
+
+
+def toDay(date):
+    """
+    Convert a date like object (str, datetime, Timestamp) to a numpy day,
+    or an array of numpy dates to an array of days
+    """
+    if isinstance(date, np.ndarray):
+        return date.astype("datetime64[D]")
+    return np.datetime64(pd.Timestamp(date), "D")
+
+
+def deriveIrelandMetrics(df, active_window=14, rolling_window=3):
+    """
+    Add the derived national series used by the dashboard to df:
+
+    EstimatedActiveCases - an estimation of the number of known active
+        cases in the community. This is the total number of cases minus the
+        total from active_window days previous, based on the assumption
+        that all cases from that long ago should be cured of the disease.
+    RollingConfirmedCovidCases - rolling average of the daily cases
+    """
+    total = df["TotalConfirmedCovidCases"]
+    df["EstimatedActiveCases"] = total - total.shift(active_window, fill_value=0)
+
+    df["RollingConfirmedCovidCases"] = (
+        df["ConfirmedCovidCases"].rolling(rolling_window, min_periods=1).mean()
+    )
+
+    return df
+
+
+def prepareIreland(df, active_window=14, rolling_window=3):
+    """
+    Loading stage for the national statistics. Returns a copy of the table
+    with the Date column parsed into datetimes and the derived metrics
+    added. This is done once when the data is loaded and the table is
+    treated as read only afterwards.
+    """
+    df = df.copy()
+    df["Date"] = parseDate(df["Date"])
+    return deriveIrelandMetrics(df, active_window, rolling_window)
+
+
+def appendIreland(df, rows, active_window=14, rolling_window=3):
+    """
+    Return a copy of a prepared national table with new raw rows, all of
+    them dated after the last row of df, parsed and appended. Only the new
+    rows' derived metrics are computed, using the last few rows of df as
+    the context needed by the windowed metrics.
+    """
+    rows = rows.copy()
+    rows["Date"] = parseDate(rows["Date"])
+
+    context = df.iloc[-max(active_window, rolling_window) :]
+    combined = pd.concat([context, rows], ignore_index=True)
+    combined = deriveIrelandMetrics(combined, active_window, rolling_window)
+
+    return pd.concat([df, combined.iloc[len(context) :]], ignore_index=True)
+
+
+def reserveRows(array, used, length):
+    """
+    Return array if it has room for length rows, otherwise a copy of its
+    first used rows with room for at least length rows, doubling its size
+    so appending a row at a time costs amortised constant time
+    """
+    if length <= len(array):
+        return array
+    grown = np.empty((max(length, 2 * len(array)),) + array.shape[1:], array.dtype)
+    grown[:used] = array[:used]
+    return grown
+
+
+def ffillFrom(previous, block):
+    """
+    Return block with its nans filled from the rows before them, the first
+    row's from previous, the row before the block
+    """
+    filled = pd.DataFrame(np.vstack([previous, block])).ffill().values
+    return filled[1:]
+
+
+def regionIds(series):
+    """
+    Return the distinct region ids of a column as strings, and the position
+    of each row's id among them or -1 if it has none. Only the distinct ids
+    are converted so millions of rows of a few thousand regions are cheap.
+    """
+    categorical = pd.Categorical(series)
+    return np.asarray(categorical.categories).astype(str), categorical.codes
+
+
+class CountyStore:
+    """
+    Date indexed store of the county statistics, or of the statistics of
+    any other regions keyed by the key column.
+
+    The county table is pivoted once at load time into dense date x county
+    arrays, one per metric, so the snapshot of all counties for a given
+    date is a single row lookup rather than a search of the whole table.
+    Metrics missing from the table, such as PopulationProportionCovidCases
+    in most region datasets, are left out.
+
+    New dates can be added with append, which returns a new store that
+    shares the arrays of the old one. The arrays are over allocated and
+    each store only looks at its own first len(store) rows, so appending
+    costs time proportional to the new rows and leaves older stores, which
+    may still be serving requests, unchanged.
+    """
+
+    metrics = (
+        "ConfirmedCovidCases",
+        "PopulationProportionCovidCases",
+        "PopulationCensus16",
+    )
+
+    # Metrics derived from the table's metrics by deriveMetrics
+    derived = ("CovidOverPopulation", "CovidPer100k")
+
+    # Column of the region ids
+    key = "CountyName"
+
+    def __init__(self, df, metrics=None, key=None):
+        if metrics is not None:
+            self.metrics = tuple(metrics)
+        else:
+            self.metrics = tuple(metric for metric in self.metrics if metric in df)
+        if key is not None:
+            self.key = key
+
+        self.counties = np.unique(regionIds(df[self.key])[0])
+        self.dateIndex = {}
+
+        self._length = 0
+        self._dates = np.empty(0, dtype="datetime64[D]")
+        self._buffers = {
+            metric: np.empty((0, len(self.counties)))
+            for metric in self.metrics + self.derived
+        }
+        self._max = {metric: np.nan for metric in self._buffers}
+
+        self._add(df)
+
+    @classmethod
+    def fromArrays(cls, counties, dates, values, maxima, key="CountyName"):
+        """
+        Build a store around existing arrays, e.g. memory mapped ones,
+        without copying them: the counties, the dates and the date x county
+        array and maximum of each metric. The arrays are only ever read,
+        appending to the store copies them first.
+        """
+        store = cls.__new__(cls)
+        store.metrics = tuple(metric for metric in values if metric not in cls.derived)
+        store.key = key
+        store.counties = counties
+        store.dateIndex = {date: i for i, date in enumerate(dates)}
+
+        store._length = len(dates)
+        store._dates = dates
+        store._buffers = dict(values)
+        store._max = dict(maxima)
+        return store
+
+    def append(self, df):
+        """
+        Return a new store with the rows of df added, all of the rows must
+        be dated after the last date in this store. Only the newest store
+        should be appended to as the stores share their arrays.
+        """
+        store = copy.copy(self)
+        store._buffers = dict(self._buffers)
+        store._max = dict(self._max)
+        store._add(df)
+        return store
+
+    def _reserve(self, length):
+        """Make sure the arrays can hold length dates, doubling them if not"""
+        self._dates = reserveRows(self._dates, self._length, length)
+        for metric, buffer in self._buffers.items():
+            self._buffers[metric] = reserveRows(buffer, self._length, length)
+
+    def _add(self, df):
+        """Pivot the rows of df into the arrays after the current last date"""
+        dates, date_codes = np.unique(
+            parseTimeStamp(df["TimeStamp"]), return_inverse=True
+        )
+        if len(dates) and self._length and dates[0] <= self.dates[-1]:
+            raise ValueError("Appended rows must be dated after %s" % self.dates[-1])
+
+        ids, codes = regionIds(df[self.key])
+        county_codes = pd.Index(self.counties).get_indexer(ids)[codes]
+        county_codes[codes < 0] = -1
+        if (county_codes < 0).any():
+            raise ValueError("Appended rows contain counties not in the store")
+
+        start, end = self._length, self._length + len(dates)
+        self._reserve(end)
+        self._dates[start:end] = dates
+
+        # Dense date x county array for each metric, counties with no entry
+        # for a date are left as nan
+        for metric in self.metrics:
+            block = np.full((len(dates), len(self.counties)), np.nan)
+            block[date_codes, county_codes] = df[metric].values
+            self._buffers[metric][start:end] = block
+
+        self._length = end
+        self.dateIndex.update({date: start + i for i, date in enumerate(dates)})
+        self.deriveMetrics(start, end)
+
+        # Keep a running maximum of each metric so the colour range of the
+        # map doesn't need a pass over every date
+        if end > start:
+            for metric, buffer in self._buffers.items():
+                new_max = np.fmax.reduce(buffer[start:end], axis=None)
+                self._max[metric] = np.fmax(self._max[metric], new_max)
+
+    def deriveMetrics(self, start, end):
+        """
+        Fill in the derived county metrics for the dates between start and
+        end, the confirmed cases as a % of the population and per 100,000 of
+        the population
+        """
+        cases = self._buffers["ConfirmedCovidCases"][start:end]
+        population = self._buffers["PopulationCensus16"][start:end]
+        self._buffers["CovidOverPopulation"][start:end] = cases / population * 100
+        self._buffers["CovidPer100k"][start:end] = cases / population * 100000
+
+    @property
+    def dates(self):
+        return self._dates[: self._length]
+
+    @property
+    def values(self):
+        """Dense date x county array of each metric"""
+        return {
+            metric: buffer[: self._length] for metric, buffer in self._buffers.items()
+        }
+
+    def __len__(self):
+        return self._length
+
+    def row(self, date):
+        """Return the row number of a date or None if it is not in the store"""
+        i = self.dateIndex.get(toDay(date))
+        if i is None or i >= self._length:
+            return None
+        return i
+
+    def max(self, metric):
+        """Return the maximum of a metric over all dates and counties"""
+        return self._max[metric]
+
+    def snapshot(self, date):
+        """
+        Return a dataframe of every county's metrics on a given date or
+        None if there is no data for that date
+        """
+        i = self.row(date)
+        if i is None:
+            return None
+
+        snapshot = pd.DataFrame({self.key: self.counties})
+        for metric, buffer in self._buffers.items():
+            snapshot[metric] = buffer[i]
+
+        return snapshot
+
+
+class IrelandStore:
+    """
+    Date indexed matrix of the numeric national statistics.
+
+    The numeric columns of the national table are copied once at load time
+    into a dense date x column array, so every statistic for a given date
+    is a single row lookup and a group of statistics is a slice of that
+    row, rather than a search of the table and a lookup per column.
+
+    New rows are added with append, which like CountyStore.append returns
+    a new store sharing the over allocated arrays of the old one.
+    """
+
+    def __init__(self, df):
+        numeric = [
+            column
+            for column in df.columns
+            if pd.api.types.is_numeric_dtype(df[column])
+            and not pd.api.types.is_bool_dtype(df[column])
+        ]
+        self.columns = {column: i for i, column in enumerate(numeric)}
+        self.dateIndex = {}
+
+        self._length = 0
+        self._matrix = np.empty((0, len(numeric)))
+        self._dates = np.empty(0, dtype="datetime64[D]")
+        self._add(df)
+
+    @classmethod
+    def fromArrays(cls, columns, matrix, dates):
+        """
+        Build a store around existing arrays, e.g. memory mapped ones,
+        without copying them: the names of the matrix columns, the date x
+        column matrix and the dates. Appending to the store copies the
+        arrays first.
+        """
+        store = cls.__new__(cls)
+        store.columns = {column: i for i, column in enumerate(columns)}
+        store.dateIndex = {date: i for i, date in enumerate(dates)}
+
+        store._length = len(dates)
+        store._matrix = matrix
+        store._dates = dates
+        return store
+
+    def append(self, df):
+        """
+        Return a new store with the rows of df, a prepared national table,
+        added. Only the newest store should be appended to as the stores
+        share their arrays.
+        """
+        store = copy.copy(self)
+        store._add(df)
+        return store
+
+    def _add(self, df):
+        """Copy the rows of df into the arrays after the current last row"""
+        start, end = self._length, self._length + len(df)
+        self._matrix = reserveRows(self._matrix, start, end)
+        self._dates = reserveRows(self._dates, start, end)
+        self._matrix[start:end] = df[list(self.columns)].values.astype(float)
+        self._dates[start:end] = parseTimeStamp(df["Date"])
+        self._length = end
+
+        # Later rows win if a date appears more than once
+        self.dateIndex.update(
+            {date: start + i for i, date in enumerate(self._dates[start:end])}
+        )
+
+    @property
+    def matrix(self):
+        return self._matrix[: self._length]
+
+    @property
+    def dates(self):
+        return self._dates[: self._length]
+
+    def __len__(self):
+        return self._length
+
+    def indices(self, columns):
+        """Return the matrix column numbers of a list of columns"""
+        return np.array([self.columns[column] for column in columns])
+
+    def row(self, date):
+        """
+        Return every statistic on a given date as one row of the matrix or
+        None if there is no data for that date
+        """
+        i = self.dateIndex.get(toDay(date))
+        if i is None or i >= self._length:
+            return None
+        return self._matrix[i]
+
+
+class RangeStore:
+    """
+    Prefix sums of the county and national case and death counts.
+
+    The total of a daily count over any window of dates is the difference
+    of two rows of its prefix sums, so aggregating a window costs the same
+    however long the window is. The county cases are already a running
+    total, which is their prefix sum once any date a county has no entry
+    for is filled from the date before.
+
+    The sums of stores with new dates are extended with append, carrying the
+    last row of the sums forward, so they cost time proportional to the new
+    dates. Like CountyStore the stores share over allocated arrays.
+    """
+
+    # Daily national counts which are summed over a window
+    national = ("ConfirmedCovidCases", "ConfirmedCovidDeaths")
+
+    def __init__(self, county_store, ireland_store):
+        self.counties = county_store.counties
+        self.key = county_store.key
+
+        # The first row of each prefix sum is the empty sum
+        self._county_sums = np.zeros((1, len(self.counties)))
+        self._national_sums = np.zeros((1, len(self.national)))
+        self.population = np.full(len(self.counties), np.nan)
+        self._add(county_store, ireland_store, 0, 0)
+
+    @classmethod
+    def fromArrays(
+        cls, county_store, ireland_store, county_sums, national_sums, population
+    ):
+        """
+        Build a store of the sums of county and national stores around
+        existing arrays, e.g. memory mapped ones, without copying them: the
+        prefix sums with their leading row of zeros and the last population
+        of each county. Appending to the store copies the arrays first.
+        """
+        store = cls.__new__(cls)
+        store.counties = county_store.counties
+        store.key = county_store.key
+        store._county_sums = county_sums
+        store._national_sums = national_sums
+        store.population = population
+
+        store.county_dates = county_store.dates
+        store.county_sums = county_sums
+        store.national_dates = ireland_store.dates
+        store.national_sums = national_sums
+        return store
+
+    def append(self, county_store, ireland_store):
+        """
+        Return a new store with the sums extended to the dates added to the
+        county and national stores since this store was built from them
+        """
+        store = copy.copy(self)
+        store._add(
+            county_store,
+            ireland_store,
+            len(self.county_dates),
+            len(self.national_dates),
+        )
+        return store
+
+    def _add(self, county_store, ireland_store, county_start, national_start):
+        """
+        Extend the sums with the county and national rows after the starts.
+        Sums with no new rows are left alone, they may be read only arrays.
+        """
+        county_end = len(county_store)
+        if county_end > county_start:
+            self._county_sums = reserveRows(
+                self._county_sums, county_start + 1, county_end + 1
+            )
+            values = county_store.values
+            self._county_sums[county_start + 1 : county_end + 1] = ffillFrom(
+                self._county_sums[county_start],
+                values["ConfirmedCovidCases"][county_start:county_end],
+            )
+            population = values["PopulationCensus16"][county_start:county_end]
+            self.population = ffillFrom(self.population, population)[-1]
+        self.county_dates = county_store.dates
+        self.county_sums = self._county_sums[: county_end + 1]
+
+        national_end = len(ireland_store)
+        if national_end > national_start:
+            self._national_sums = reserveRows(
+                self._national_sums, national_start + 1, national_end + 1
+            )
+            daily = ireland_store.matrix[national_start:national_end]
+            daily = np.nan_to_num(daily[:, ireland_store.indices(self.national)])
+            self._national_sums[national_start + 1 : national_end + 1] = (
+                self._national_sums[national_start] + np.cumsum(daily, axis=0)
+            )
+        self.national_dates = ireland_store.dates
+        self.national_sums = self._national_sums[: national_end + 1]
+
+    @staticmethod
+    def _bounds(dates, start, end):
+        """
+        Return the prefix sum rows bounding the dates start to end, start
+        and end can be arrays of dates to bound many windows at once
+        """
+        lo = np.searchsorted(dates, toDay(start), side="left")
+        hi = np.searchsorted(dates, toDay(end), side="right")
+        return lo, np.maximum(lo, hi)
+
+    def countyCases(self, start, end):
+        """
+        Return the cases of each county, in the order of counties, dated
+        from start to end inclusive. With arrays of starts and ends there is
+        a row of cases for each window.
+        """
+        lo, hi = self._bounds(self.county_dates, start, end)
+        return self.county_sums[hi] - self.county_sums[lo]
+
+    def countyRates(self, start, end, per=100000):
+        """Return the cases of each county from start to end per person"""
+        return self.countyCases(start, end) / self.population * per
+
+    def weekOverWeek(self, end):
+        """
+        Return the % change of each county's cases in the week up to end
+        over the week before, nan where there were no cases the week before.
+        With an array of ends there is a row of changes for each end.
+        """
+        end = toDay(end)
+        week = np.timedelta64(7, "D")
+        this_week = self.countyCases(end - week + 1, end)
+        last_week = self.countyCases(end - 2 * week + 1, end - week)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = (this_week - last_week) / last_week * 100
+        change[last_week == 0] = np.nan
+        return change
+
+    def nationalTotals(self, start, end):
+        """
+        Return the national cases and deaths dated from start to end
+        inclusive, and each per 100,000 people
+        """
+        lo, hi = self._bounds(self.national_dates, start, end)
+        sums = self.national_sums[hi] - self.national_sums[lo]
+        population = np.nansum(self.population)
+
+        totals = {}
+        for metric, total in zip(self.national, sums):
+            totals[metric] = total
+            totals[metric + "Per100k"] = total / population * 100000
+        return totals
+
+    def summary(self, start, end):
+        """
+        Return a dataframe of each county's cases from start to end, the
+        cases per 100,000 people and the week over week change at end
+        """
+        cases = self.countyCases(start, end)
+        return pd.DataFrame(
+            {
+                self.key: self.counties,
+                "ConfirmedCovidCases": cases,
+                "CovidPer100k": cases / self.population * 100000,
+                "WeekOverWeekChange": self.weekOverWeek(end),
+            }
+        )
+
+
+class Snapshot:
+    """
+    Snapshot of all of the data served by the dashboard: the national
+    table with its derived series and its date indexed matrix, the county
+    store, prefix sums for aggregating over date ranges, and any figures
+    the app builds from them. A new snapshot is built for every data load
+    and swapped in at once, it is never modified after that so callbacks
+    can read it without locking.
+    """
+
+    def __init__(
+        self,
+        df_county,
+        df_ireland,
+        version=0,
+        active_window=14,
+        rolling_window=3,
+        region_key="CountyName",
+    ):
+        self._build(
+            prepareIreland(df_ireland, active_window, rolling_window),
+            CountyStore(df_county, key=region_key),
+            version,
+            active_window,
+            rolling_window,
+        )
+
+    @classmethod
+    def fromData(
+        cls,
+        df_ireland,
+        county_store,
+        version=0,
+        active_window=14,
+        rolling_window=3,
+        ireland_store=None,
+        ranges=None,
+    ):
+        """
+        Build a snapshot from an already prepared national table and county
+        store, and the national store and prefix sums built from them if
+        they have them, otherwise those are built here
+        """
+        snapshot = cls.__new__(cls)
+        snapshot._build(
+            df_ireland,
+            county_store,
+            version,
+            active_window,
+            rolling_window,
+            ireland_store,
+            ranges,
+        )
+        return snapshot
+
+    def _build(
+        self,
+        df_ireland,
+        county_store,
+        version,
+        active_window,
+        rolling_window,
+        ireland_store=None,
+        ranges=None,
+    ):
+        self.version = version
+        self.loaded = time.time()
+        self.active_window = active_window
+        self.rolling_window = rolling_window
+
+        # The national store and the prefix sums are built in full unless
+        # they have been extended from an older snapshot's by append or
+        # attached to shared arrays
+        if ireland_store is None:
+            ireland_store = IrelandStore(df_ireland)
+        if ranges is None:
+            ranges = RangeStore(county_store, ireland_store)
+
+        self.df_ireland = df_ireland
+        self.ireland_store = ireland_store
+        self.county_store = county_store
+        self.ranges = ranges
+
+        # pandas daterange of the maximum date range of the county data
+        self.daterange = pd.date_range(
+            start=county_store.dates[0], end=county_store.dates[-1], freq="D"
+        )
+
+        # Figures built by the app from this snapshot, filled in before the
+        # snapshot is swapped in
+        self.figures = {}
+
+        # Keys of the versions of the datasets the snapshot was read from in
+        # full, if it was, so a reload of the same versions can be skipped
+        self.dataset_keys = None
+
+    def lastDates(self):
+        """
+        Return the last county TimeStamp and national Date in the snapshot
+        as 'yyyy/mm/dd' strings, the format used by the dataset
+        """
+        return (
+            pd.Timestamp(self.county_store.dates[-1]).strftime("%Y/%m/%d"),
+            self.df_ireland["Date"].iloc[-1].strftime("%Y/%m/%d"),
+        )
+
+    def append(self, county_rows, ireland_rows, version):
+        """
+        Return a new snapshot with the raw rows added since this snapshot
+        was loaded appended to its data. Only the new rows are parsed and
+        only their derived metrics, index entries and prefix sums are
+        computed.
+        """
+        df_ireland = self.df_ireland
+        ireland_store = self.ireland_store
+        if len(ireland_rows):
+            df_ireland = appendIreland(
+                df_ireland, ireland_rows, self.active_window, self.rolling_window
+            )
+            ireland_store = ireland_store.append(
+                df_ireland.iloc[len(self.df_ireland) :]
+            )
+
+        county_store = self.county_store
+        if len(county_rows):
+            county_store = county_store.append(county_rows)
+
+        return Snapshot.fromData(
+            df_ireland,
+            county_store,
+            version,
+            self.active_window,
+            self.rolling_window,
+            ireland_store,
+            self.ranges.append(county_store, ireland_store),
+        )
@@ -0,0 +1,311 @@
+"""
+Export every figure of the dashboard to static files, so a snapshot of the
+dashboard can be published as a static site, e.g.
+
+    python export.py site --formats json html --workers 4
+
+writes:
+
+    site/map/<metric>/<yyyy-mm-dd>.<format> - the map of each date and metric
+    site/breakdown/<name>/<yyyy-mm-dd>.<format> - each breakdown of each date
+    site/totals/<name>.<format> - each totals figure
+    site/manifest.json - the inputs and the sha1 of the json of each figure
+
+The figures are built with the same functions as the dashboard. A figure is
+only built again when its inputs have changed since the last export,
+according to manifest.json, or with --force. The inputs are a hash of the
+data, the map geometry, the code the figures are built with and the job
+and formats. A figure that is built again is only written if its json has
+changed. PNG files need kaleido to be installed, without it they are
+skipped.
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.graph_objects as go
+
+from breakdowns import breakdowns
+from figures import (
+    buildBreakdownFigure,
+    buildMapFigure,
+    buildMapValues,
+    buildTotalFigure,
+    map_options,
+    mapGeometry,
+    total_options,
+)
+from ireland_dash import defaultConfig, loadData, loadRegions
+
+formats = ["json", "html", "png"]
+
+# Modules the figures are built with, a change to any of them builds every
+# figure again
+figure_modules = [
+    "breakdowns.py",
+    "datastore.py",
+    "figures.py",
+    "geometry.py",
+    "regions.py",
+]
+
+# Data and map geometry of the export, loaded once in the parent process
+# and inherited by forked workers, or loaded by initWorker otherwise
+_data = None
+_geometry = None
+
+
+def initWorker(config):
+    """
+    Function to load the data and map geometry in a worker process if it
+    wasn't inherited from the parent
+    """
+    global _data, _geometry
+    if _data is None:
+        _data = loadData(config)
+    if _geometry is None:
+        layer = loadRegions(
+            config["GEOJSON_PATH"],
+            config["GEOJSON_TOLERANCE"],
+            config["GEOJSON_ID_PROPERTY"],
+        )
+        _geometry = mapGeometry(_data, layer, config["MAP_ZOOM"])
+
+
+def exportJobs(data):
+    """
+    Function to return every figure to export as (kind, name, date) tuples,
+    date being None for the totals figures
+    """
+    dates = [date.strftime("%Y-%m-%d") for date in data.daterange]
+    jobs = [("map", metric, date) for metric in map_options for date in dates]
+    jobs += [("breakdown", name, date) for name in breakdowns for date in dates]
+    jobs += [("totals", name, None) for name in total_options]
+    return jobs
+
+
+def inputsKey(data, config):
+    """
+    Function to return a hash of everything the figures are built from: the
+    values of the data, the geojson and map settings, the figure code and
+    the plotly version
+    """
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(data.df_ireland).values.tobytes())
+    county_store = data.county_store
+    digest.update(np.asarray(county_store.counties).astype(str).tobytes())
+    digest.update(county_store.dates.tobytes())
+    for metric, values in sorted(county_store.values.items()):
+        digest.update(metric.encode())
+        digest.update(np.ascontiguousarray(values).tobytes())
+
+    settings = [
+        config[name]
+        for name in ("GEOJSON_TOLERANCE", "GEOJSON_ID_PROPERTY", "MAP_ZOOM")
+    ]
+    digest.update(json.dumps(settings + [plotly.__version__]).encode())
+
+    rootdir = os.path.dirname(os.path.abspath(__file__))
+    for path in [config["GEOJSON_PATH"]] + [
+        os.path.join(rootdir, name) for name in figure_modules
+    ]:
+        with open(path, "rb") as myfile:
+            digest.update(hashlib.sha1(myfile.read()).digest())
+    return digest.hexdigest()
+
+
+def jobKey(inputs, job, formats):
+    """Function to return the key of a job's outputs in the manifest"""
+    return hashlib.sha1(json.dumps([inputs, job, formats]).encode()).hexdigest()
+
+
+def jobPath(job):
+    """Function to return the output path of a job without its extension"""
+    kind, name, date = job
+    if date is None:
+        return "%s/%s" % (kind, name)
+    return "%s/%s/%s" % (kind, name, date)
+
+
+def buildFigure(job):
+    """Function to build the figure of a job from the loaded data"""
+    kind, name, date = job
+    if kind == "map":
+        fig = buildMapFigure(buildMapValues(_data, date, name), _geometry)
+    elif kind == "breakdown":
+        fig = buildBreakdownFigure(_data, name, date)
+    elif kind == "totals":
+        fig = buildTotalFigure(_data, name)
+    return go.Figure(fig)
+
+
+def writeFile(path, write):
+    """
+    Function to write a file through write(temporary path), then rename it
+    so a half written file is never published
+    """
+    temp = "%s.%i.tmp" % (path, os.getpid())
+    write(temp)
+    os.replace(temp, path)
+
+
+def renderJob(task):
+    """
+    Function to build a job's figure and write it in each format, unless
+    its hash matches the previous export and all of its files exist.
+    Returns the job's path, the hash of its figure and whether it was
+    written.
+    """
+    job, out, formats, previous, force = task
+    fig = buildFigure(job)
+    fig_json = fig.to_json()
+    digest = hashlib.sha1(fig_json.encode()).hexdigest()
+
+    path = os.path.join(out, jobPath(job))
+    files = [path + "." + extension for extension in formats]
+    if not force and digest == previous and all(map(os.path.exists, files)):
+        return jobPath(job), digest, False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for extension, filename in zip(formats, files):
+        if extension == "json":
+
+            def write(temp):
+                with open(temp, "w") as myfile:
+                    myfile.write(fig_json)
+
+        elif extension == "html":
+
+            def write(temp):
+                fig.write_html(temp, include_plotlyjs="cdn")
+
+        elif extension == "png":
+
+            def write(temp):
+                fig.write_image(temp, format="png")
+
+        writeFile(filename, write)
+
+    return jobPath(job), digest, True
+
+
+def readManifest(out):
+    """
+    Function to read the inputs and hashes of the previous export, if any,
+    as {path: {"inputs": key, "sha1": hash}}
+    """
+    try:
+        with open(os.path.join(out, "manifest.json")) as myfile:
+            manifest = json.load(myfile)
+    except (OSError, ValueError):
+        return {}
+
+    # Manifests of older exports only have the hashes
+    return {
+        path: entry if isinstance(entry, dict) else {"inputs": None, "sha1": entry}
+        for path, entry in manifest.items()
+    }
+
+
+def upToDate(out, job, key, formats, entry):
+    """
+    Function to return whether the outputs of a job were written from the
+    same inputs by the previous export and all of them exist
+    """
+    if entry is None or entry["inputs"] != key:
+        return False
+    path = os.path.join(out, jobPath(job))
+    return all(os.path.exists(path + "." + extension) for extension in formats)
+
+
+def export(out, formats=("json", "html"), workers=None, force=False, config=None):
+    """
+    Function to export every figure to the out directory in the given
+    formats with a pool of worker processes, returning the number of
+    figures written and skipped. Figures whose inputs are unchanged since
+    the last export are skipped without being built.
+    """
+    config = dict(defaultConfig(), **(config or {}))
+
+    formats = list(formats)
+    if "png" in formats and importlib.util.find_spec("kaleido") is None:
+        print("kaleido is not installed, skipping png export")
+        formats.remove("png")
+
+    # Load the data before starting the pool so forked workers share it
+    start = time.time()
+    initWorker(config)
+    jobs = exportJobs(_data)
+    print(
+        "Loaded data in %.2fs, %i figures to export" % (time.time() - start, len(jobs))
+    )
+
+    os.makedirs(out, exist_ok=True)
+    manifest = readManifest(out)
+    inputs = inputsKey(_data, config)
+    keys = {jobPath(job): jobKey(inputs, job, formats) for job in jobs}
+
+    # Only the jobs whose inputs have changed are built
+    tasks = []
+    for job in jobs:
+        entry = manifest.get(jobPath(job))
+        if force or not upToDate(out, job, keys[jobPath(job)], formats, entry):
+            previous = entry["sha1"] if entry else None
+            tasks.append((job, out, formats, previous, force))
+
+    # Jobs are handed to the workers in chunks as each one is quick
+    written = 0
+    if tasks:
+        workers = workers or os.cpu_count()
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(
+            workers, initializer=initWorker, initargs=(config,)
+        ) as pool:
+            for path, digest, changed in pool.map(
+                renderJob, tasks, chunksize=chunksize
+            ):
+                manifest[path] = {"inputs": keys[path], "sha1": digest}
+                written += changed
+
+    def write(temp):
+        with open(temp, "w") as myfile:
+            json.dump(manifest, myfile, indent=1, sort_keys=True)
+
+    writeFile(os.path.join(out, "manifest.json"), write)
+
+    print(
+        "Exported %i figures, %i up to date, in %.2fs"
+        % (written, len(jobs) - written, time.time() - start)
+    )
+    return written, len(jobs) - written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the dashboard figures to static files"
+    )
+    parser.add_argument("out", help="directory to write the figures to")
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=formats,
+        default=["json", "html"],
+        help="formats to write, png needs kaleido",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="number of worker processes, one per cpu by default"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="write every figure even if unchanged"
+    )
+    args = parser.parse_args()
+
+    export(args.out, args.formats, args.workers, args.force)
@@ -0,0 +1,173 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from columncache import cacheDir, fileKey, readColumns, typeColumns, writeColumns
+
+# A loaded dataset, where it was loaded from ("network", "cache" if the
+# dataset was unchanged on the server and read from the column cache,
+# "unchanged" if it was unchanged and only its new rows were wanted, or
+# "file" for the local copy), how long it took in seconds and the key of
+# the version of the dataset, a hash of the download or the size and mtime
+# of the local copy
+Loaded = namedtuple("Loaded", ["df", "source", "seconds", "key"])
+
+
+class Fetcher:
+    """
+    Downloader of the datasets.
+
+    Connections are pooled in a single requests session and every request
+    has a (connect, read) timeout. The ETag and Last-Modified validators of
+    each download are remembered, on disk if a path is given, so later
+    downloads of a dataset are conditional requests and an unchanged
+    dataset is answered with 304 Not Modified instead of the whole file.
+    """
+
+    def __init__(self, path=None, timeout=(5, 30), pool_size=4):
+        self.path = path
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.validators = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as myfile:
+                self.validators = json.load(myfile)
+
+    def _save(self):
+        """Write the validators to disk"""
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w") as myfile:
+            json.dump(self.validators, myfile)
+        os.replace(self.path + ".tmp", self.path)
+
+    def fetch(self, url, conditional=True):
+        """
+        Download url and return (content, key) where key is a sha1 hash of
+        the content. If the conditional request finds the dataset unchanged
+        since the last download content is None and key is the key of the
+        last download.
+        """
+        validator = self.validators.get(url, {}) if conditional else {}
+
+        headers = {}
+        if "etag" in validator:
+            headers["If-None-Match"] = validator["etag"]
+        if "last_modified" in validator:
+            headers["If-Modified-Since"] = validator["last_modified"]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and validator:
+            return None, validator["key"]
+        response.raise_for_status()
+
+        content = response.content
+        validator = {"key": hashlib.sha1(content).hexdigest()}
+        if "ETag" in response.headers:
+            validator["etag"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            validator["last_modified"] = response.headers["Last-Modified"]
+
+        with self._lock:
+            self.validators[url] = validator
+            self._save()
+
+        return content, validator["key"]
+
+
+def dataframeLoader(online, local, fetcher, dates=()):
+    """
+    Load data from corona virus database or fallback to a local dataset,
+    returning a Loaded. With online None only the local dataset is read.
+
+    Parsed datasets are kept in a columnar cache next to the local dataset,
+    keyed by a hash of the downloaded data or the size and mtime of the
+    local file, so unchanged data is read from the cache instead of being
+    parsed again, and its columns are memory mapped from the cache rather
+    than read into memory. The given date columns are returned parsed and
+    text columns as categoricals.
+    """
+    start = time.time()
+    cache = cacheDir(local)
+
+    # Datasets with no online copy, such as local region datasets, are
+    # read from the local file
+    if online is None:
+        source = "file"
+        key = fileKey(local)
+        data = local
+
+    else:
+        try:
+            # Try load the data directly from the virus database
+            content, key = fetcher.fetch(online)
+
+            # If it hasn't changed since the last download use the cached
+            # copy, unless the cache has gone in which case download it in
+            # full
+            if content is None:
+                df = readColumns(cache, key)
+                if df is not None:
+                    return Loaded(df, "cache", time.time() - start, key)
+                content, key = fetcher.fetch(online, conditional=False)
+
+            source = "network"
+            data = io.BytesIO(content)
+
+        except Exception as e:
+            # If it fails to load then load the data from an archived copy
+            # of the database
+            print("Could not load %s: %s" % (online, e))
+            source = "file"
+            key = fileKey(local)
+            data = local
+
+    df = readColumns(cache, key)
+    if df is None:
+        df = typeColumns(pd.read_csv(data), dates)
+        try:
+            writeColumns(df, cache, key)
+        except OSError as e:
+            print("Could not write cache %s: %s" % (cache, e))
+        else:
+            # Use the written cache, as the later loads will, so the data is
+            # memory mapped and its columns are in the same order every time
+            df = readColumns(cache, key)
+
+    return Loaded(df, source, time.time() - start, key)
+
+
+def loadDatasets(datasets, fetcher):
+    """
+    Load several datasets at once in a thread pool, datasets is a list of
+    (online, local, dates). Returns a list of Loaded in the same order.
+    """
+    with ThreadPoolExecutor(max_workers=len(datasets)) as pool:
+        futures = [
+            pool.submit(dataframeLoader, online, local, fetcher, dates)
+            for online, local, dates in datasets
+        ]
+        results = [future.result() for future in futures]
+
+    for (online, local, dates), loaded in zip(datasets, results):
+        print(
+            "Loaded %s from %s in %.2fs"
+            % (os.path.basename(local), loaded.source, loaded.seconds)
+        )
+
+    return results
@@ -0,0 +1,331 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import plotly.express as px
+import plotly.graph_objects as go
+
+from breakdowns import breakdowns, breakdownValues
+
+# Map and total figure dropdown values
+map_options = ["total", "proportional", "change"]
+total_options = ["total", "daily", "active"]
+
+
+def noDataGraph():
+    """
+    Function to return a null graph object to be used where there is no
+    data in the database
+    """
+    return {
+        "layout": {
+            "xaxis": {"visible": False},
+            "yaxis": {"visible": False},
+            "annotations": [
+                {
+                    "text": "No matching data found",
+                    "xref": "paper",
+                    "yref": "paper",
+                    "showarrow": False,
+                    "font": {"size": 28},
+                }
+            ],
+        }
+    }
+
+
+def jsonList(array):
+    """Return a numpy array as a list with nan replaced by None"""
+    return [None if np.isnan(value) else value for value in array.tolist()]
+
+
+def figureTemplate():
+    """
+    Function to return the default plotly template as plain data so
+    figures assembled in the browser look the same as server built ones
+    """
+    return json.loads(go.Figure().to_json())["layout"]["template"]
+
+
+def mapGeometry(data, layer, zoom=5, center=None):
+    """
+    Function to return the region geometry and everything else about the
+    map that doesn't change with the date. The geometry is the view of the
+    region layer for the map's zoom and centre, the layer's centre if not
+    given, and is sent again only when the map is zoomed or panned out of
+    the view.
+    """
+    center = center or layer.center()
+    view, geojson = layer.view(zoom, center["lat"], center["lon"])
+    return {
+        "geojson": geojson,
+        "view": list(view),
+        "featureidkey": layer.featureidkey,  # GeoJSON entry to match regions
+        "region": data.county_store.key,
+        "locations": data.county_store.counties.tolist(),
+        "center": center,
+        "zoom": zoom,
+        "colorscale": [
+            [i / (len(px.colors.sequential.Plasma) - 1), colour]
+            for i, colour in enumerate(px.colors.sequential.Plasma)
+        ],
+    }
+
+
+def buildTotalFigure(data, dropdown):
+    """
+    Function to build the total figure and return it as plain json
+    serialisable data without its template, which is sent to the browser
+    separately
+    """
+    df_ireland = data.df_ireland
+
+    if dropdown == "total":
+        fig = go.Figure(
+            data=go.Scatter(
+                x=df_ireland["Date"],
+                y=df_ireland["TotalConfirmedCovidCases"],
+                mode="lines+markers",
+            )
+        )
+        fig.update_layout(title="Total Covid Cases", margin=dict(l=0, r=0, t=50, b=50))
+
+    elif dropdown == "daily":
+        fig = go.Figure(
+            data=go.Scatter(
+                x=df_ireland["Date"],
+                y=df_ireland["ConfirmedCovidCases"],
+                mode="lines+markers",
+                name="Known Cases",
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=df_ireland["Date"],
+                y=df_ireland["RollingConfirmedCovidCases"],
+                mode="lines+markers",
+                name="3 Day Rolling Avg.",
+            )
+        )
+        fig.update_layout(title="Daily Covid Cases", margin=dict(l=0, r=0, t=50, b=50))
+
+    elif dropdown == "active":
+        fig = go.Figure(
+            go.Scatter(
+                x=df_ireland["Date"],
+                y=df_ireland["EstimatedActiveCases"],
+                mode="lines+markers",
+            )
+        )
+        fig.update_layout(
+            title="Estimate of Active Covid Cases", margin=dict(l=0, r=0, t=50, b=50)
+        )
+
+    fig.update_layout(height=350, legend=dict(x=0.625, y=0.99))
+    fig.update_xaxes(tickangle=45, tickformat="%m/%d")
+
+    figure = json.loads(fig.to_json())
+    del figure["layout"]["template"]
+    return figure
+
+
+def buildTotalsFigures(data):
+    """
+    Function to build all of the total figures, they only change when new
+    data is loaded so they are built once and the browser switches between
+    them
+    """
+    return {dropdown: buildTotalFigure(data, dropdown) for dropdown in total_options}
+
+
+def buildMapValues(data, date, dropdown):
+    """
+    Function to build the per county values shown on the map for a date.
+    Only these values and the colour range are sent on each update, the
+    figure is put together in the browser from the map geometry store.
+    Returns None if there is no data for the date.
+    """
+
+    county_store = data.county_store
+    df_slice = county_store.snapshot(date)
+
+    # If there is no data for a given date then the browser shows a null
+    # graph object
+    if df_slice is None:
+        return None
+
+    if dropdown == "change":
+        return buildChangeValues(data, date)
+
+    if dropdown == "total":
+        column = "ConfirmedCovidCases"
+        label = "Total Cases"
+        title = "Total Covid Cases"
+        range_max = county_store.max("ConfirmedCovidCases")
+
+    elif dropdown == "proportional":
+        column = "CovidOverPopulation"
+        label = "% of population"
+        title = "Proportional Covid Cases"
+        range_max = np.nanmax(df_slice["CovidOverPopulation"])
+
+    # Depricated plot
+    elif dropdown == "proportional2":
+        column = "PopulationProportionCovidCases"
+        label = "per 100,000"
+        title = "Proportional Covid Cases"
+        range_max = np.nanmax(df_slice["PopulationProportionCovidCases"])
+
+    return {
+        "z": jsonList(df_slice[column].values),
+        "range": [0, float(range_max)],
+        "label": label,
+        "title": title,
+    }
+
+
+def buildRangeValues(data, start, end, dropdown):
+    """
+    Function to build the per county values shown on the map for a range
+    of dates, the cases dated from start to end or the cases per 100,000
+    people, aggregated from the prefix sums of the snapshot
+    """
+    if dropdown == "change":
+        return buildChangeValues(data, end)
+
+    dates = "%s - %s" % (
+        pd.Timestamp(start).strftime("%m/%d"),
+        pd.Timestamp(end).strftime("%m/%d"),
+    )
+    if dropdown == "total":
+        values = data.ranges.countyCases(start, end)
+        label = "Cases"
+        title = "Covid Cases %s" % dates
+
+    elif dropdown == "proportional":
+        values = data.ranges.countyRates(start, end)
+        label = "per 100,000"
+        title = "Covid Cases per 100,000 %s" % dates
+
+    return {
+        "z": jsonList(values),
+        "range": [0, float(np.nan_to_num(np.fmax.reduce(values)))],
+        "label": label,
+        "title": title,
+    }
+
+
+def buildChangeValues(data, end):
+    """
+    Function to build the per county % change of the cases in the week up
+    to end over the week before, with a colour range centred on no change
+    """
+    change = data.ranges.weekOverWeek(end)
+    limit = float(np.nan_to_num(np.fmax.reduce(np.abs(change))))
+    return {
+        "z": jsonList(change),
+        "range": [-limit, limit],
+        "label": "% change",
+        "title": "Week on Week Change in Cases to %s"
+        % pd.Timestamp(end).strftime("%m/%d"),
+    }
+
+
+def buildMapFigure(values, geometry):
+    """
+    Function to build the map figure from the map values and the map
+    geometry on the server, the same figure the browser puts together in
+    mapFigure in assets/clientside.js
+    """
+    if values is None:
+        return go.Figure(noDataGraph())
+
+    fig = go.Figure(
+        go.Choroplethmapbox(
+            geojson=geometry["geojson"],
+            featureidkey=geometry["featureidkey"],
+            locations=geometry["locations"],
+            z=values["z"],
+            coloraxis="coloraxis",
+            hovertemplate=geometry["region"]
+            + "=%{location}<br>"
+            + values["label"]
+            + "=%{z}<extra></extra>",
+        )
+    )
+    fig.update_layout(
+        title=values["title"],
+        margin=dict(l=0, r=0, t=50, b=50),
+        mapbox=dict(
+            style="carto-positron", center=geometry["center"], zoom=geometry["zoom"]
+        ),
+        uirevision="map",
+        coloraxis=dict(
+            cmin=values["range"][0],
+            cmax=values["range"][1],
+            colorscale=geometry["colorscale"],
+            colorbar=dict(title=values["label"]),
+        ),
+    )
+    return fig
+
+
+def buildMapFrames(data, dropdown):
+    """
+    Function to build the per county values of every date at once for
+    playing the map back in the browser, one frame per date. The frames
+    are slices of the date x county arrays, or for the week on week change
+    computed for every date in one go from the prefix sums, and they share
+    one colour range so the colours are comparable from frame to frame.
+    """
+    county_store = data.county_store
+    dates = county_store.dates
+
+    if dropdown == "total":
+        values = county_store.values["ConfirmedCovidCases"]
+        label = "Total Cases"
+        title = "Total Covid Cases"
+        value_range = [0, county_store.max("ConfirmedCovidCases")]
+
+    elif dropdown == "proportional":
+        values = county_store.values["CovidOverPopulation"]
+        label = "% of population"
+        title = "Proportional Covid Cases"
+        value_range = [0, county_store.max("CovidOverPopulation")]
+
+    elif dropdown == "change":
+        values = data.ranges.weekOverWeek(dates)
+        label = "% change"
+        title = "Week on Week Change in Cases"
+        limit = np.nan_to_num(np.fmax.reduce(np.abs(values), axis=None))
+        value_range = [-limit, limit]
+
+    return {
+        "dates": [pd.Timestamp(date).strftime("%m/%d") for date in dates],
+        "z": [jsonList(row) for row in values],
+        "range": [float(value) for value in value_range],
+        "label": label,
+        "title": title,
+    }
+
+
+def buildBreakdownFigure(data, dropdown, date):
+    """
+    Function to build and return the breakdown figure for a date
+    """
+    values = breakdownValues(data.ireland_store, dropdown, date)
+
+    # If there is no data for a given date then return a null graph object
+    if values is None or np.isnan(values).any():
+        return noDataGraph()
+
+    # Otherwise return a graph object
+    breakdown = breakdowns[dropdown]
+    values = values.tolist()
+    fig = go.Figure(
+        data=[go.Bar(x=breakdown.labels, y=values, text=values, textposition="outside")]
+    )
+    fig.update_layout(title=breakdown.title, margin=dict(l=0, r=0, t=50, b=50))
+
+    return fig
@@ -0,0 +1,99 @@
+import numpy as np
+
+
+def simplifyLine(points, tolerance):
+    """
+    Simplify a line of [lon, lat] points with the Ramer-Douglas-Peucker
+    algorithm, dropping points that are closer than tolerance (in degrees)
+    to the line joining the points that are kept
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    # Work through the segments with an explicit stack rather than recursion
+    # so long coastlines can't hit the recursion limit
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        start, end = points[first], points[last]
+        inner = points[first + 1 : last]
+        segment = end - start
+        length = np.hypot(*segment)
+
+        # Perpendicular distance of each inner point from the segment, or
+        # the distance from the start point if the segment is a closed ring
+        if length == 0:
+            distances = np.hypot(*(inner - start).T)
+        else:
+            offset = inner - start
+            cross = segment[0] * offset[:, 1] - segment[1] * offset[:, 0]
+            distances = np.abs(cross) / length
+
+        i = np.argmax(distances)
+        if distances[i] > tolerance:
+            keep[first + 1 + i] = True
+            stack.append((first, first + 1 + i))
+            stack.append((first + 1 + i, last))
+
+    return points[keep]
+
+
+def simplifyRing(ring, tolerance):
+    """
+    Simplify a closed polygon ring, keeping at least the four points
+    needed for a valid ring
+    """
+    simplified = simplifyLine(ring, tolerance)
+    if len(simplified) < 4:
+        return np.asarray(ring, dtype=float)
+    return simplified
+
+
+def simplifyGeometry(geometry, tolerance):
+    """Return a copy of a Polygon or MultiPolygon geometry simplified"""
+
+    def polygon(rings):
+        return [simplifyRing(ring, tolerance).tolist() for ring in rings]
+
+    if geometry["type"] == "Polygon":
+        coordinates = polygon(geometry["coordinates"])
+    elif geometry["type"] == "MultiPolygon":
+        coordinates = [polygon(rings) for rings in geometry["coordinates"]]
+    else:
+        return geometry
+
+    return dict(geometry, coordinates=coordinates)
+
+
+def simplifyGeojson(geojson, tolerance):
+    """
+    Return a copy of a geojson FeatureCollection with every feature's
+    geometry simplified to the given tolerance in degrees. A tolerance of
+    0 or less returns the geojson unchanged.
+    """
+    if not tolerance or tolerance <= 0:
+        return geojson
+
+    features = [
+        dict(feature, geometry=simplifyGeometry(feature["geometry"], tolerance))
+        for feature in geojson["features"]
+    ]
+    return dict(geojson, features=features)
+
+
+def countPoints(geojson):
+    """Return the total number of coordinate points in a geojson"""
+
+    def count(coordinates):
+        if isinstance(coordinates[0], (int, float)):
+            return 1
+        return sum(count(c) for c in coordinates)
+
+    return sum(count(f["geometry"]["coordinates"]) for f in geojson["features"])
@@ -0,0 +1,84 @@
+import io
+import time
+
+import pandas as pd
+
+from columncache import fileKey, typeColumns
+from fetch import Loaded
+
+
+def readLocal(local):
+    """Read the csv text of a local copy of a dataset with its key"""
+    with open(local, encoding="utf-8-sig") as myfile:
+        return myfile.read(), "file", fileKey(local)
+
+
+def readText(online, local, fetcher):
+    """
+    Read the csv text of a dataset from the corona virus database or
+    fallback to a local copy of it. Returns the text, where it was read
+    from and the key of the dataset version, as for a Loaded. The text is
+    None and the source "unchanged" if the fetcher finds the dataset
+    unchanged since it was last downloaded. With online None only the
+    local copy is read.
+    """
+    if online is None:
+        return readLocal(local)
+
+    try:
+        # Try load the data directly from the virus database
+        content, key = fetcher.fetch(online)
+        if content is None:
+            return None, "unchanged", key
+        return content.decode("utf-8-sig"), "network", key
+    except Exception as e:
+        # If it fails to load then load the data from an archived copy
+        # of the database
+        print("Could not load %s: %s" % (online, e))
+        return readLocal(local)
+
+
+def newRows(text, last, column):
+    """
+    Parse and return only the rows of a csv whose date column is after the
+    'yyyy/mm/dd' date last.
+
+    The datasets are in date order so the text is scanned backwards line
+    by line from the end until a row dated last or earlier is found. Only
+    the rows after it are parsed, so the cost is proportional to the number
+    of new rows rather than to the size of the dataset.
+    """
+    header_end = text.index("\n")
+    header = text[:header_end].rstrip("\r")
+    position = header.split(",").index(column)
+
+    # Walk back from the end of the last line to find the first new row
+    end = len(text.rstrip("\r\n"))
+    first_new = end
+    while end > header_end:
+        start = text.rfind("\n", header_end, end) + 1
+        line = text[start:end].rstrip("\r")
+        if line and line.split(",")[position][:10] <= last:
+            break
+        first_new = start
+        end = start - 1
+
+    return pd.read_csv(io.StringIO(header + "\n" + text[first_new:]))
+
+
+def loadNewRows(online, local, dates, fetcher, last, column):
+    """
+    Load a dataset returning a Loaded of all of its rows if last is None,
+    otherwise of only the rows whose date column is after last. The given
+    date columns are parsed. The dataframe is empty if the dataset hasn't
+    changed on the server.
+    """
+    start = time.time()
+    text, source, key = readText(online, local, fetcher)
+    if text is None:
+        df = pd.DataFrame()
+    elif last is None:
+        df = typeColumns(pd.read_csv(io.StringIO(text)), dates)
+    else:
+        df = typeColumns(newRows(text, last, column), dates)
+    return Loaded(df, source, time.time() - start, key)
@@ -1,17 +1,39 @@
+import os
 import time
 import json
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
-import numpy as np
 
+import flask
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 
-import plotly.express as px
-import plotly.graph_objects as go
+from breakdowns import breakdowns
+from cache import CallbackCache, FileCache, LRUCache
+from datastore import Snapshot, toDay
+from fetch import Fetcher, loadDatasets
+from figures import (
+    buildBreakdownFigure,
+    buildMapFrames,
+    buildMapValues,
+    buildRangeValues,
+    buildTotalsFigures,
+    figureTemplate,
+    mapGeometry,
+    map_options,
+)
+from geometry import simplifyGeojson
+from ingest import loadNewRows
+from metrics import appMetrics
+from refresher import DataRefresher
+from regions import RegionLayer
+from shared import SharedSnapshots
 
 
 # https://stackoverflow.com/questions/51063191/date-slider-with-plotly-dash-does-not-work
@@ -31,7 +53,7 @@ def getMarks(start, end, Nth=10):
     """
 
     result = {}
-    for i, date in enumerate(daterange):
+    for i, date in enumerate(pd.date_range(start, end, freq="D")):
         if i % Nth == 1:
             # Append value to dict
             result[unixTimeMillis(date)] = {
@@ -42,676 +64,893 @@ def getMarks(start, end, Nth=10):
     return result
 
 
-def noDataGraph():
+# Directory of the app, the data and geojson are found relative to it
+rootdir = os.path.dirname(os.path.abspath(__file__))
+
+def defaultConfig():
     """
-    Function to return a null graph object to be used where there is no
-    data in the database
+    Function to return the default app config, each value can be set with
+    an environment variable of the same name:
+
+    DATA_URL - base url of the online datasets
+    DATA_DIR - directory of the local copies of the datasets
+    GEOJSON_PATH - county outlines, downloaded from:
+        https://gist.github.com/eoiny/2183412
+        or the outlines of any other regions, see REGION_DATA
+    GEOJSON_TOLERANCE - simplify the outlines when they are loaded, given
+        in degrees, on top of the simplification for each zoom level
+    GEOJSON_ID_PROPERTY - feature property matched to the region ids
+    MAP_ZOOM - initial zoom of the map
+    REGION_DATA - csv of the statistics of the regions in GEOJSON_PATH,
+        e.g. electoral divisions, shown on the map instead of the county
+        dataset. It has the columns of the county dataset: REGION_KEY,
+        TimeStamp, ConfirmedCovidCases and PopulationCensus16.
+    REGION_DATA_URL - online copy of REGION_DATA, if any
+    REGION_KEY - column of the region ids in the county or region dataset
+    MAP_CACHE_SIZE - number of map values kept in the map cache
+    CALLBACK_CACHE - where callback results are cached, "memory" for each
+        process, "filesystem" for a cache shared by the workers, which
+        requires SHARED_DATA_DIR so the workers agree on the data versions,
+        or "none"
+    CALLBACK_CACHE_DIR - directory of the filesystem callback cache
+    CALLBACK_CACHE_SIZE - number of callback results kept in the cache
+    CALLBACK_CACHE_TTL - seconds a callback result is kept, 0 for no limit
+    WARM_MAP_CACHE - build every map value when the data is loaded
+    ACTIVE_CASE_WINDOW - number of days a case is estimated to be active
+    REFRESH_INTERVAL - seconds between data reloads, 0 disables the reload
+    INCREMENTAL_INGEST - only parse the rows added to the datasets since
+        the current snapshot was loaded and append them to it
+    FETCH_TIMEOUT - read timeout of the downloads in seconds
+    PLAYBACK_FPS - frames per second when the map is played back
+    PRELOAD - load the data when the app is created rather than on first
+        use, see create_app
+    SHARED_DATA_DIR - directory of the snapshots shared by several worker
+        processes, see shared.SharedSnapshots. Not shared if unset.
+    SHARED_POLL_INTERVAL - seconds between checks for a newer shared
+        snapshot
+    METRICS - time the server side callbacks and data loads and serve the
+        timings at /metrics in the Prometheus text format, set to 0 to
+        disable
+    METRICS_LOG - also print the timings of each callback as a json line
     """
+    env = os.environ.get
+    data_dir = env("DATA_DIR", os.path.join(rootdir, "data"))
     return {
-        "layout": {
-            "xaxis": {"visible": False},
-            "yaxis": {"visible": False},
-            "annotations": [
-                {
-                    "text": "No matching data found",
-                    "xref": "paper",
-                    "yref": "paper",
-                    "showarrow": False,
-                    "font": {"size": 28},
-                }
-            ],
-        }
+        "DATA_URL": env("DATA_URL", "http://opendata-geohive.hub.arcgis.com/datasets/"),
+        "DATA_DIR": data_dir,
+        "GEOJSON_PATH": env("GEOJSON_PATH", os.path.join(data_dir, "ireland.json")),
+        "GEOJSON_TOLERANCE": float(env("GEOJSON_TOLERANCE", 0)),
+        "GEOJSON_ID_PROPERTY": env("GEOJSON_ID_PROPERTY", "county"),
+        "MAP_ZOOM": float(env("MAP_ZOOM", 5)),
+        "REGION_DATA": env("REGION_DATA"),
+        "REGION_DATA_URL": env("REGION_DATA_URL"),
+        "REGION_KEY": env("REGION_KEY", "CountyName"),
+        "MAP_CACHE_SIZE": int(env("MAP_CACHE_SIZE", 256)),
+        "CALLBACK_CACHE": env("CALLBACK_CACHE", "memory"),
+        "CALLBACK_CACHE_DIR": env(
+            "CALLBACK_CACHE_DIR", os.path.join(data_dir, "cache", "callbacks")
+        ),
+        "CALLBACK_CACHE_SIZE": int(env("CALLBACK_CACHE_SIZE", 1024)),
+        "CALLBACK_CACHE_TTL": float(env("CALLBACK_CACHE_TTL", 0)),
+        "WARM_MAP_CACHE": env("WARM_MAP_CACHE") == "1",
+        "ACTIVE_CASE_WINDOW": int(env("ACTIVE_CASE_WINDOW", 14)),
+        "REFRESH_INTERVAL": int(env("REFRESH_INTERVAL", 3600)),
+        "INCREMENTAL_INGEST": env("INCREMENTAL_INGEST") == "1",
+        "FETCH_TIMEOUT": float(env("FETCH_TIMEOUT", 30)),
+        "PLAYBACK_FPS": float(env("PLAYBACK_FPS", 4)),
+        "PRELOAD": env("PRELOAD") == "1",
+        "SHARED_DATA_DIR": env("SHARED_DATA_DIR"),
+        "SHARED_POLL_INTERVAL": int(env("SHARED_POLL_INTERVAL", 60)),
+        "METRICS": env("METRICS", "1") == "1",
+        "METRICS_LOG": env("METRICS_LOG") == "1",
     }
 
 
-def dataframeLoader(online, local):
-    """Load data from corona virus database or fallback to a local dataset"""
-    try:
-        # Try load the data directly from the virus database
-        print("Loading from url: %s" % online)
-        df = pd.read_csv(online)
-    except:
-        # If it fails to load then load the data from an archived copy
-        # of the database
-        print("Loading from file: %s" % local)
-        df = pd.read_csv(local)
-
-    return df
-
-
-# Load geojson from file, downloaded from:
-# https://gist.github.com/eoiny/2183412
-with open(
-    "/home/chris/Projects/Data_Science/Project_corona_irl/data/ireland.json"
-) as myfile:
-    geojson = json.load(myfile)
-
-
-rooturl = "http://opendata-geohive.hub.arcgis.com/datasets/"
-rootdir = "/home/chris/Projects/Data_Science/Project_corona_irl/data/"
-
-# Load data from corona virus databases
-df_county = dataframeLoader(
-    rooturl + "d9be85b30d7748b5b7c09450b8aede63_0.csv",
-    rootdir + "Covid19CountyStatisticsHPSCIreland.csv",
-)
+@functools.lru_cache(maxsize=None)
+def loadRegions(path, tolerance=0, id_property="county"):
+    """
+    Function to load the region geojson, simplified to the given tolerance,
+    and index it as a RegionLayer. It is only read once per process and
+    shared by every page load.
+    """
+    with open(path) as myfile:
+        geojson = json.load(myfile)
+    return RegionLayer(simplifyGeojson(geojson, tolerance), id_property)
 
-df_ireland = dataframeLoader(
-    rooturl + "d8eb52d56273413b84b0187a4e9117be_0.csv",
-    rootdir + "CovidStatisticsProfileHPSCIrelandOpenData.csv",
-)
 
-# pandas daterange of the maximum date range of the data is used as an
-# input for the date slider
-daterange = pd.date_range(
-    start=df_county["TimeStamp"].iloc[0], end=df_county["TimeStamp"].iloc[-1], freq="D"
-)
+def serveLayout(data, layer, playback_fps=4, zoom=5):
+    """
+    Main layout of the dash app, built for each page load from the current
+    data snapshot. With data None the layout has every component but no
+    data, which is all dash needs to validate the callbacks.
+    """
+    if data is None:
+        stats = {"cases": "", "deaths": "", "date": ""}
+        totals_figures = map_geometry = None
+        slider = {"min": 0, "max": 0, "marks": {}, "value": 0, "range": [0, 0]}
 
-# An estimation of the number of known active cases of Covid-19 in the
-# community. This number of calculated by taking the total number of
-# active cases for a date and subtracting the total known cases from two
-# weeks previous. This is based on the assumtion that all active cases
-# from two weeks ago should be cured of the disease.
-ealist = []
-for i in range(len(df_ireland)):
-    # If i is less than 14 then all active cases are considered still active
-    if i < 14:
-        ealist.append(df_ireland["TotalConfirmedCovidCases"].iloc[i])
-
-    # Otherwise subtract the number of active cases from two weeks previous
     else:
-        ealist.append(
-            df_ireland["TotalConfirmedCovidCases"].iloc[i]
-            - df_ireland["TotalConfirmedCovidCases"].iloc[i - 14]
-        )
-
-# Add the list of estimated active cases to the dataframe
-df_ireland["EstimatedActiveCases"] = ealist
+        df_ireland = data.df_ireland
+        daterange = data.daterange
 
+        stats = {
+            "cases": "Cases %i" % df_ireland["TotalConfirmedCovidCases"].iloc[-1],
+            "deaths": "Deaths %i" % df_ireland["TotalCovidDeaths"].iloc[-1],
+            "date": "as of %s" % df_ireland["Date"].iloc[-1].strftime("%Y/%m/%d"),
+        }
+        totals_figures = data.figures["totals"]
+        map_geometry = mapGeometry(data, layer, zoom)
+        slider = {
+            "min": unixTimeMillis(daterange.min()),
+            "max": unixTimeMillis(daterange.max()),
+            "marks": getMarks(
+                daterange.min(), daterange.max(), int(len(daterange) / 10)
+            ),
+            "value": unixTimeMillis(daterange.max()),
+            # The last two weeks are selected when switching to a date range
+            "range": [
+                unixTimeMillis(daterange[max(0, len(daterange) - 14)]),
+                unixTimeMillis(daterange.max()),
+            ],
+        }
 
-# Start the Dash app
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-
-# Main layout of the dash app
-app.layout = html.Div(
-    [
-        dbc.Row(
-            # Col - width 12
-            dbc.Col(
-                [
-                    # Title Card
-                    dbc.Card(
-                        dbc.CardBody(
-                            [
-                                html.H3(
-                                    "Irish Covid-19 Data Dashboard",
-                                    style={"text-align": "center", "margin": "0px"},
-                                )
-                            ]
-                        ),
-                        className="mt-3 ml-3",
-                    ),
-                ]
-            )
-        ),
-        dbc.Row(
-            [
-                # Col - width 12 mobile, width 4 desktop
+    return html.Div(
+        [
+            # Plotly template shared by the figures built clientside
+            dcc.Store(id="figure-template", data=figureTemplate()),
+            dbc.Row(
+                # Col - width 12
                 dbc.Col(
                     [
-                        # Total Stats Card
-                        dbc.Card(
-                            dbc.CardBody(
-                                [
-                                    html.H4(
-                                        "Total Number of:", className="card-title",
-                                    ),
-                                    html.H1(
-                                        "Cases %i"
-                                        % df_ireland["TotalConfirmedCovidCases"].iloc[
-                                            -1
-                                        ],
-                                        style={"text-align": "center"},
-                                    ),
-                                    html.H1(
-                                        "Deaths %i"
-                                        % df_ireland["TotalCovidDeaths"].iloc[-1],
-                                        style={"text-align": "center"},
-                                    ),
-                                    html.P(
-                                        html.Small(
-                                            "as of %s"
-                                            % df_ireland["Date"].iloc[-1][:10]
-                                        ),
-                                        style={"text-align": "right", "margin": "0px"},
-                                    ),
-                                ]
-                            ),
-                            className="mt-3 ml-3",
-                        ),
-                        # Totals Graph Card
+                        # Title Card
                         dbc.Card(
                             dbc.CardBody(
                                 [
-                                    html.Div(dcc.Graph(id="irl-totals")),
-                                    html.Div(
-                                        dcc.Dropdown(
-                                            id="total-dropdown",
-                                            options=[
-                                                {
-                                                    "label": "Total Confirmed Cases",
-                                                    "value": "total",
-                                                },
-                                                {
-                                                    "label": "Daily Confirmed Cases",
-                                                    "value": "daily",
-                                                },
-                                                {
-                                                    "label": "Estimate of Active Cases",
-                                                    "value": "active",
-                                                },
-                                            ],
-                                            value="total",
-                                        )
-                                    ),
+                                    html.H3(
+                                        "Irish Covid-19 Data Dashboard",
+                                        style={"text-align": "center", "margin": "0px"},
+                                    )
                                 ]
                             ),
                             className="mt-3 ml-3",
                         ),
-                    ],
-                    md=12,
-                    lg=4,
-                ),
-                # Col - width 12 mobile, width 8 desktop
-                dbc.Col(
-                    [
-                        dbc.Row(
-                            [
-                                # Col - width 6
-                                dbc.Col(
+                    ]
+                )
+            ),
+            dbc.Row(
+                [
+                    # Col - width 12 mobile, width 4 desktop
+                    dbc.Col(
+                        [
+                            # Total Stats Card
+                            dbc.Card(
+                                dbc.CardBody(
                                     [
-                                        # Map Card
-                                        dbc.Card(
-                                            dbc.CardBody(
-                                                [
-                                                    html.Div(dcc.Graph(id="irl-map",)),
-                                                    html.Div(
-                                                        dcc.Dropdown(
-                                                            id="map-dropdown",
-                                                            options=[
-                                                                {
-                                                                    "label": "Total Infections",
-                                                                    "value": "total",
-                                                                },
-                                                                {
-                                                                    "label": "Proportional Infections",
-                                                                    "value": "proportional",
-                                                                },
-                                                            ],
-                                                            value="total",
-                                                        )
-                                                    ),
-                                                ]
-                                            ),
-                                            className="mt-3 ml-3 ml-lg-0",
+                                        html.H4(
+                                            "Total Number of:", className="card-title",
+                                        ),
+                                        html.H1(
+                                            stats["cases"],
+                                            style={"text-align": "center"},
+                                        ),
+                                        html.H1(
+                                            stats["deaths"],
+                                            style={"text-align": "center"},
+                                        ),
+                                        html.P(
+                                            html.Small(stats["date"]),
+                                            style={"text-align": "right", "margin": "0px"},
                                         ),
-                                    ],
-                                    width=6,
-                                    className="px-lg-0",
+                                    ]
                                 ),
-                                # Col - width 6
-                                dbc.Col(
+                                className="mt-3 ml-3",
+                            ),
+                            # Totals Graph Card
+                            dbc.Card(
+                                dbc.CardBody(
                                     [
-                                        # Graph Card
-                                        dbc.Card(
-                                            dbc.CardBody(
-                                                [
-                                                    html.Div(
-                                                        dcc.Graph(id="irl-breakdown",)
-                                                    ),
-                                                    html.Div(
-                                                        dcc.Dropdown(
-                                                            id="breakdown-dropdown",
-                                                            options=[
-                                                                {
-                                                                    "label": "Transmission",
-                                                                    "value": "transmission",
-                                                                },
-                                                                {
-                                                                    "label": "Gender",
-                                                                    "value": "gender",
-                                                                },
-                                                                {
-                                                                    "label": "Cases Age Profile",
-                                                                    "value": "caseAge",
-                                                                },
-                                                                {
-                                                                    "label": "Hospitalization Age Profile",
-                                                                    "value": "hospitalAge",
-                                                                },
-                                                                {
-                                                                    "label": "Likelihood of Hospitalization",
-                                                                    "value": "hospitalOdds",
-                                                                },
-                                                            ],
-                                                            value="transmission",
-                                                        )
-                                                    ),
-                                                ]
-                                            ),
-                                            className="mt-3 ml-3",
+                                        html.Div(dcc.Graph(id="irl-totals")),
+                                        dcc.Store(id="totals-figures", data=totals_figures),
+                                        html.Div(
+                                            dcc.Dropdown(
+                                                id="total-dropdown",
+                                                options=[
+                                                    {
+                                                        "label": "Total Confirmed Cases",
+                                                        "value": "total",
+                                                    },
+                                                    {
+                                                        "label": "Daily Confirmed Cases",
+                                                        "value": "daily",
+                                                    },
+                                                    {
+                                                        "label": "Estimate of Active Cases",
+                                                        "value": "active",
+                                                    },
+                                                ],
+                                                value="total",
+                                            )
                                         ),
-                                    ],
-                                    width=6,
-                                    className="pl-lg-0",
+                                    ]
                                 ),
-                                # Col - width 12
-                                dbc.Col(
-                                    [
-                                        # Slider Card
-                                        dbc.Card(
-                                            dbc.CardBody(
-                                                [
-                                                    html.P(
-                                                        id="slider-output-container",
-                                                        style={"text-align": "right"},
-                                                        className="px-3",
-                                                    ),
-                                                    html.Div(
-                                                        dcc.Slider(
-                                                            id="map-slider",
-                                                            min=unixTimeMillis(
-                                                                daterange.min()
-                                                            ),
-                                                            max=unixTimeMillis(
-                                                                daterange.max()
-                                                            ),
-                                                            marks=getMarks(
-                                                                daterange.min(),
-                                                                daterange.max(),
-                                                                int(
-                                                                    len(daterange) / 10
+                                className="mt-3 ml-3",
+                            ),
+                        ],
+                        md=12,
+                        lg=4,
+                    ),
+                    # Col - width 12 mobile, width 8 desktop
+                    dbc.Col(
+                        [
+                            dbc.Row(
+                                [
+                                    # Col - width 6
+                                    dbc.Col(
+                                        [
+                                            # Map Card
+                                            dbc.Card(
+                                                dbc.CardBody(
+                                                    [
+                                                        html.Div(dcc.Graph(id="irl-map",)),
+                                                        # Geometry sent again
+                                                        # only for a new view
+                                                        dcc.Store(
+                                                            id="map-geometry",
+                                                            data=map_geometry,
+                                                        ),
+                                                        dcc.Store(
+                                                            id="map-view",
+                                                            data=map_geometry
+                                                            and map_geometry["view"],
+                                                        ),
+                                                        dcc.Store(id="map-values"),
+                                                        html.Div(
+                                                            dcc.Dropdown(
+                                                                id="map-dropdown",
+                                                                options=[
+                                                                    {
+                                                                        "label": "Total Infections",
+                                                                        "value": "total",
+                                                                    },
+                                                                    {
+                                                                        "label": "Proportional Infections",
+                                                                        "value": "proportional",
+                                                                    },
+                                                                    {
+                                                                        "label": "Week on Week Change",
+                                                                        "value": "change",
+                                                                    },
+                                                                ],
+                                                                value="total",
+                                                            )
+                                                        ),
+                                                    ]
+                                                ),
+                                                className="mt-3 ml-3 ml-lg-0",
+                                            ),
+                                        ],
+                                        width=6,
+                                        className="px-lg-0",
+                                    ),
+                                    # Col - width 6
+                                    dbc.Col(
+                                        [
+                                            # Graph Card
+                                            dbc.Card(
+                                                dbc.CardBody(
+                                                    [
+                                                        html.Div(
+                                                            dcc.Graph(id="irl-breakdown",)
+                                                        ),
+                                                        html.Div(
+                                                            dcc.Dropdown(
+                                                                id="breakdown-dropdown",
+                                                                options=[
+                                                                    {
+                                                                        "label": breakdown.label,
+                                                                        "value": name,
+                                                                    }
+                                                                    for name, breakdown in breakdowns.items()
+                                                                ],
+                                                                value="transmission",
+                                                            )
+                                                        ),
+                                                    ]
+                                                ),
+                                                className="mt-3 ml-3",
+                                            ),
+                                        ],
+                                        width=6,
+                                        className="pl-lg-0",
+                                    ),
+                                    # Col - width 12
+                                    dbc.Col(
+                                        [
+                                            # Slider Card
+                                            dbc.Card(
+                                                dbc.CardBody(
+                                                    [
+                                                        html.Div(
+                                                            [
+                                                                # Plays every date of the map
+                                                                # in the browser
+                                                                html.Button(
+                                                                    "Play",
+                                                                    id="map-play",
+                                                                    n_clicks=0,
+                                                                    className="btn btn-outline-primary btn-sm",
+                                                                ),
+                                                                html.Span(
+                                                                    id="slider-output-container",
                                                                 ),
+                                                            ],
+                                                            className="px-3 mb-3 d-flex justify-content-between align-items-center",
+                                                        ),
+                                                        dcc.Store(id="map-frames"),
+                                                        dcc.Store(id="map-frame"),
+                                                        dcc.Interval(
+                                                            id="map-interval",
+                                                            interval=1000 / playback_fps,
+                                                            disabled=True,
+                                                        ),
+                                                        # Map of a single day or totalled
+                                                        # over a range of days
+                                                        dcc.RadioItems(
+                                                            id="map-mode",
+                                                            options=[
+                                                                {"label": "Single Day", "value": "day"},
+                                                                {"label": "Date Range", "value": "range"},
+                                                            ],
+                                                            value="day",
+                                                            className="px-3",
+                                                            inputClassName="mr-1",
+                                                            labelStyle={
+                                                                "display": "inline-block",
+                                                                "margin-right": "1rem",
+                                                            },
+                                                        ),
+                                                        html.Div(
+                                                            dcc.Slider(
+                                                                id="map-slider",
+                                                                min=slider["min"],
+                                                                max=slider["max"],
+                                                                marks=slider["marks"],
+                                                                step=86400,
+                                                                value=slider["value"],
                                                             ),
-                                                            step=86400,
-                                                            value=unixTimeMillis(
-                                                                daterange.max()
+                                                            id="map-slider-container",
+                                                        ),
+                                                        html.Div(
+                                                            dcc.RangeSlider(
+                                                                id="map-range-slider",
+                                                                min=slider["min"],
+                                                                max=slider["max"],
+                                                                marks=slider["marks"],
+                                                                step=86400,
+                                                                value=slider["range"],
                                                             ),
-                                                        )
-                                                    ),
-                                                ]
-                                            ),
-                                            className="mt-3 ml-3 ml-lg-0",
-                                        )
-                                    ],
-                                    width=12,
-                                    className="pl-lg-0",
-                                ),
-                            ]
-                        ),
-                    ],
-                    md=12,
-                    lg=8,
-                ),
-            ],
-        ),
-        dbc.Row(
-            # Col - width 12
-            dbc.Col(
-                [
-                    # Sources Card
-                    dbc.Card(
-                        dbc.CardBody(
-                            [
-                                html.Div("Sources:"),
-                                html.Div(
-                                    html.A(
-                                        "https://data.gov.ie/dataset/covidstatisticsprofilehpscirelandopendata",
-                                        href="https://data.gov.ie/dataset/covidstatisticsprofilehpscirelandopendata",
+                                                            id="map-range-container",
+                                                            style={"display": "none"},
+                                                        ),
+                                                    ]
+                                                ),
+                                                className="mt-3 ml-3 ml-lg-0",
+                                            )
+                                        ],
+                                        width=12,
+                                        className="pl-lg-0",
                                     ),
-                                    className="pl-3",
-                                ),
-                                html.Div(
-                                    html.A(
-                                        "https://data.gov.ie/dataset/covid19countystatisticshpscireland",
-                                        href="https://data.gov.ie/dataset/covid19countystatisticshpscireland",
+                                ]
+                            ),
+                        ],
+                        md=12,
+                        lg=8,
+                    ),
+                ],
+            ),
+            dbc.Row(
+                # Col - width 12
+                dbc.Col(
+                    [
+                        # Sources Card
+                        dbc.Card(
+                            dbc.CardBody(
+                                [
+                                    html.Div("Sources:"),
+                                    html.Div(
+                                        html.A(
+                                            "https://data.gov.ie/dataset/covidstatisticsprofilehpscirelandopendata",
+                                            href="https://data.gov.ie/dataset/covidstatisticsprofilehpscirelandopendata",
+                                        ),
+                                        className="pl-3",
                                     ),
-                                    className="pl-3",
-                                ),
-                                html.Div(
-                                    html.A(
-                                        "https://gist.github.com/eoiny/2183412",
-                                        href="https://gist.github.com/eoiny/2183412",
+                                    html.Div(
+                                        html.A(
+                                            "https://data.gov.ie/dataset/covid19countystatisticshpscireland",
+                                            href="https://data.gov.ie/dataset/covid19countystatisticshpscireland",
+                                        ),
+                                        className="pl-3",
                                     ),
-                                    className="pl-3",
-                                ),
-                                html.Div(
-                                    html.A(
-                                        "https://dash.plotly.com/",
-                                        href="https://dash.plotly.com/",
+                                    html.Div(
+                                        html.A(
+                                            "https://gist.github.com/eoiny/2183412",
+                                            href="https://gist.github.com/eoiny/2183412",
+                                        ),
+                                        className="pl-3",
                                     ),
-                                    className="pl-3",
-                                ),
-                            ]
+                                    html.Div(
+                                        html.A(
+                                            "https://dash.plotly.com/",
+                                            href="https://dash.plotly.com/",
+                                        ),
+                                        className="pl-3",
+                                    ),
+                                ]
+                            ),
+                            className="my-3 ml-3",
                         ),
-                        className="my-3 ml-3",
-                    ),
-                ]
-            )
-        ),
-    ],
-)
+                    ]
+                )
+            ),
+        ],
+    )
 
 
-@app.callback(
-    dash.dependencies.Output("slider-output-container", "children"),
-    [dash.dependencies.Input("map-slider", "value")],
-)
-def update_output(value):
+def warmMapCache(data, map_cache):
+    """Build and cache the map values for every date and map dropdown value"""
+    start = time.time()
+    size = len(data.county_store) * len(map_options)
+    map_cache.maxsize = max(map_cache.maxsize, size)
+    for date in data.county_store.dates:
+        for dropdown in map_options:
+            key = (data.version, date, dropdown)
+            map_cache.getOrBuild(key, buildMapValues, data, date, dropdown)
+    print("Warmed map cache in %.2fs" % (time.time() - start))
+
+
+def dataSources(config):
     """
-    Function to update the slider output container to let the user know
-    what date was selected
+    Function to return the online and local sources of the county and
+    national datasets and the date columns of each, parsed when the
+    datasets are loaded. With REGION_DATA set the region dataset takes the
+    place of the county dataset.
     """
-    return "Date Selected: {}".format(unixToDatetime(value).strftime("%m/%d"))
+    rooturl, datadir = config["DATA_URL"], config["DATA_DIR"]
+    county_dataset = (
+        rooturl + "d9be85b30d7748b5b7c09450b8aede63_0.csv",
+        os.path.join(datadir, "Covid19CountyStatisticsHPSCIreland.csv"),
+        ["TimeStamp"],
+    )
+    if config["REGION_DATA"]:
+        county_dataset = (config["REGION_DATA_URL"], config["REGION_DATA"], ["TimeStamp"])
+    ireland_dataset = (
+        rooturl + "d8eb52d56273413b84b0187a4e9117be_0.csv",
+        os.path.join(datadir, "CovidStatisticsProfileHPSCIrelandOpenData.csv"),
+        ["Date", "StatisticsProfileDate"],
+    )
+    return county_dataset, ireland_dataset
 
 
-@app.callback(
-    Output("irl-map", "figure"),
-    [
-        dash.dependencies.Input("map-slider", "value"),
-        dash.dependencies.Input("map-dropdown", "value"),
-    ],
-)
-def update_map_figure(slider, dropdown):
+def dataFetcher(config):
     """
-    Function to build and return the map figure
+    Function to return a connection pooled downloader of the datasets which
+    remembers the ETag and Last-Modified of each download so unchanged
+    datasets aren't downloaded again
     """
-
-    df_slice = df_county[
-        df_county["TimeStamp"].str.contains(unixToDatetime(slider).strftime("%Y/%m/%d"))
-    ]
-
-    # If there is no data for a given date then return a null graph object
-    if len(df_slice) < 1:
-        return noDataGraph()
-
-    # This creates the warning "A value is trying to be set on a copy of
-    # a slice from a DataFrame" but also creates the intended outcome of
-    # creating a temporary entry to a slice of the dataframe so the
-    # warning should be ignored
-    pd.options.mode.chained_assignment = None
-    df_slice["CovidOverPopulation"] = (
-        df_slice["ConfirmedCovidCases"] / df_slice["PopulationCensus16"] * 100
+    return Fetcher(
+        os.path.join(config["DATA_DIR"], "cache", "http.json"),
+        timeout=(5, config["FETCH_TIMEOUT"]),
     )
-    pd.options.mode.chained_assignment = "warn"
-
-    if dropdown == "total":
-        fig = px.choropleth_mapbox(
-            df_slice,
-            geojson=geojson,
-            color="ConfirmedCovidCases",  # Data to be plotted
-            locations="CountyName",  # Dataframe entry to match to geojson
-            featureidkey="properties.county",  # GeoJSON entry to match dataframe
-            center={"lat": 53.45, "lon": -8},  # Center map display
-            mapbox_style="carto-positron",
-            zoom=5,
-            labels={"ConfirmedCovidCases": "Total Cases"},
-            range_color=(0, max(df_county["ConfirmedCovidCases"])),
-        )
-        fig.update_layout(title="Total Covid Cases", margin=dict(l=0, r=0, t=50, b=50))
-
-    elif dropdown == "proportional":
-        fig = px.choropleth_mapbox(
-            df_slice,
-            geojson=geojson,
-            color="CovidOverPopulation",  # Data to be plotted
-            locations="CountyName",  # Dataframe entry to match to geojson
-            featureidkey="properties.county",  # GeoJSON entry to match dataframe
-            center={"lat": 53.45, "lon": -8},  # Center map display
-            mapbox_style="carto-positron",
-            zoom=5,
-            labels={"CovidOverPopulation": "% of population"},
-            range_color=(0, max(df_slice["CovidOverPopulation"])),
-        )
-        fig.update_layout(
-            title="Proportional Covid Cases", margin=dict(l=0, r=0, t=50, b=50)
-        )
 
-    # Depricated plot
-    elif dropdown == "proportional2":
-        fig = px.choropleth_mapbox(
-            df_slice,
-            geojson=geojson,
-            color="PopulationProportionCovidCases",  # Data to be plotted
-            locations="CountyName",  # Dataframe entry to match to geojson
-            featureidkey="properties.county",  # GeoJSON entry to match dataframe
-            center={"lat": 53.45, "lon": -8},  # Center map display
-            mapbox_style="carto-positron",
-            zoom=5,
-            labels={"PopulationProportionCovidCases": "per 100,000"},
-            range_color=(0, max(df_slice["PopulationProportionCovidCases"])),
-        )
 
-        fig.update_layout(
-            title="Proportional Covid Cases", margin=dict(l=0, r=0, t=50, b=50)
+def recordLoads(metrics, datasets, loaded):
+    """
+    Function to record the load time of each of the datasets, a list of
+    (online, local, dates), from the Loaded of each in metrics if given
+    """
+    if metrics is None:
+        return
+    for (online, local, dates), dataset in zip(datasets, loaded):
+        metrics.observe(
+            "dataset_load_seconds",
+            dataset.seconds,
+            dataset=os.path.basename(local),
+            source=dataset.source,
         )
-    return fig
 
 
-@app.callback(
-    Output("irl-totals", "figure"), [dash.dependencies.Input("total-dropdown", "value")]
-)
-def update_total_figure(dropdown):
+def readData(config, fetcher, version, metrics=None, data=None):
     """
-    Function to build and return the total figure
+    Function to read both datasets in full into a new snapshot, parsing the
+    dates, adding the derived series and indexing the county data by date.
+    The load time of each dataset is recorded in metrics if given. If data,
+    the current snapshot, was read from the same versions of both datasets,
+    e.g. the server answered 304 Not Modified for both, it is returned
+    instead of building a new snapshot.
     """
-    def datesplit(date):
-        """return 'mm/dd' from 'yyyy/mm/dd hh:mm:ss+00' provided by the dataset"""
+    datasets = dataSources(config)
+    loaded_county, loaded_ireland = loadDatasets(datasets, fetcher)
+    recordLoads(metrics, datasets, [loaded_county, loaded_ireland])
+
+    keys = [loaded_county.key, loaded_ireland.key]
+    if data is not None and data.dataset_keys == keys:
+        return data
+
+    snapshot = Snapshot(
+        loaded_county.df,
+        loaded_ireland.df,
+        version,
+        active_window=config["ACTIVE_CASE_WINDOW"],
+        region_key=config["REGION_KEY"],
+    )
+    snapshot.dataset_keys = keys
+    return snapshot
 
-        # X This is not futureproof, change the replacing of the current year more robust
-        return date.split(" ")[0].replace("2020/", "")
 
-    df_ireland["Date"] = df_ireland["Date"].apply(datesplit)
+def loadData(config=None):
+    """
+    Function to load the data outside of the app, e.g. for scripts. config
+    overrides any of the values of defaultConfig. The range queries of the
+    returned snapshot are in snapshot.ranges:
 
-    if dropdown == "total":
-        fig = go.Figure(
-            data=go.Scatter(
-                x=df_ireland["Date"],
-                y=df_ireland["TotalConfirmedCovidCases"],
-                mode="lines+markers",
-            ),
-        )
-        fig.update_layout(title="Total Covid Cases", margin=dict(l=0, r=0, t=50, b=50))
-
-    elif dropdown == "daily":
-        fig = go.Figure(
-            data=go.Scatter(
-                x=df_ireland["Date"],
-                y=df_ireland["ConfirmedCovidCases"],
-                mode="lines+markers",
-                name="Known Cases",
-            ),
+        data = loadData()
+        data.ranges.summary("2020/05/01", "2020/05/31")
+        data.ranges.nationalTotals("2020/05/01", "2020/05/31")
+    """
+    config = dict(defaultConfig(), **(config or {}))
+    return readData(config, dataFetcher(config), 1)
+
+
+def create_app(config=None):
+    """
+    Function to create the dash app. config overrides any of the values of
+    defaultConfig.
+
+    Importing this module and creating the app is cheap: the data and the
+    region geojson are loaded on first use, once per process, and the layout is
+    built from them for each page load. With PRELOAD set the data is loaded
+    here instead, so under gunicorn --preload it is loaded once in the
+    master and shared copy-on-write by the forked workers, each of which
+    then refreshes its own copy in the background.
+    """
+    config = dict(defaultConfig(), **(config or {}))
+
+    # The filesystem callback cache is keyed by data version, without shared
+    # snapshots each worker counts its own versions and the workers would
+    # serve and remove each other's results
+    if config["CALLBACK_CACHE"] == "filesystem" and not config["SHARED_DATA_DIR"]:
+        raise ValueError("CALLBACK_CACHE=filesystem requires SHARED_DATA_DIR")
+
+    county_dataset, ireland_dataset = dataSources(config)
+    fetcher = dataFetcher(config)
+
+    # Timings of the callbacks and data loads, served at /metrics
+    metrics = appMetrics(config["METRICS"], config["METRICS_LOG"])
+
+    # Cache of built map values keyed by (data version, date, map dropdown
+    # value). There are only a limited number of combinations so with
+    # WARM_MAP_CACHE every one of them is built when the data is loaded,
+    # otherwise they are built on first use
+    map_cache = LRUCache(config["MAP_CACHE_SIZE"])
+
+    def regions():
+        return loadRegions(
+            config["GEOJSON_PATH"],
+            config["GEOJSON_TOLERANCE"],
+            config["GEOJSON_ID_PROPERTY"],
         )
-        fig.add_trace(
-            go.Scatter(
-                x=df_ireland["Date"],
-                y=df_ireland["ConfirmedCovidCases"].rolling(3, min_periods=1).mean(),
-                mode="lines+markers",
-                name="3 Day Rolling Avg.",
+
+    def readSnapshot(data, version):
+        """
+        Function to load the data from the corona virus databases and build
+        a new snapshot of it, along with everything built from it. Returns
+        data, the current snapshot, if nothing has changed.
+        """
+        if config["INCREMENTAL_INGEST"] and data is not None:
+            # Download both datasets at once and parse only their new rows
+            county_last, ireland_last = data.lastDates()
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                county_rows = pool.submit(
+                    loadNewRows, *county_dataset, fetcher, county_last, "TimeStamp"
+                )
+                ireland_rows = pool.submit(
+                    loadNewRows, *ireland_dataset, fetcher, ireland_last, "Date"
+                )
+            county_rows, ireland_rows = county_rows.result(), ireland_rows.result()
+            recordLoads(
+                metrics, [county_dataset, ireland_dataset], [county_rows, ireland_rows]
             )
+            county_rows, ireland_rows = county_rows.df, ireland_rows.df
+
+            # If nothing has been added keep serving the current snapshot
+            if len(county_rows) == 0 and len(ireland_rows) == 0:
+                return data
+
+            # Rows which can't be appended, e.g. of a region the snapshot
+            # doesn't have, would fail every refresh, so read the datasets
+            # in full instead
+            try:
+                data = data.append(county_rows, ireland_rows, version)
+            except Exception as e:
+                print("Could not append the new rows, reloading the data: %s" % e)
+                data = readData(config, fetcher, version, metrics)
+
+        else:
+            new_data = readData(config, fetcher, version, metrics, data)
+
+            # If neither dataset has changed keep serving the current snapshot
+            if new_data is data:
+                return data
+            data = new_data
+
+        # The total figures are built once per data version and served from
+        # memory
+        data.figures["totals"] = buildTotalsFigures(data)
+
+        return data
+
+    def readShared(data, version):
+        """
+        Function to return the newest shared snapshot, first reading the
+        datasets and publishing a new one if the newest is older than
+        REFRESH_INTERVAL. Only one worker reads the datasets at a time, the
+        others wait for it and attach to what it published.
+        """
+        with shared.lock():
+            latest = shared.latest()
+            if latest is not None:
+                if data is None or data.version != latest["version"]:
+                    data = shared.attach(latest["version"])
+
+                age = time.time() - latest["published"]
+                if not config["REFRESH_INTERVAL"] or age < config["REFRESH_INTERVAL"]:
+                    return data
+                version = latest["version"] + 1
+
+            new_data = readSnapshot(data, version)
+            shared.publish(new_data)
+
+        if new_data is data:
+            return data
+        return shared.attach(new_data.version)
+
+    def loadSnapshot(version):
+        """
+        Function to load a new snapshot of the data ready to be swapped in
+        """
+        data = refresher.current
+        start = time.time()
+        if shared is None:
+            new_data = readSnapshot(data, version)
+        else:
+            new_data = readShared(data, version)
+        metrics.observe("data_refresh_seconds", time.time() - start)
+
+        if new_data is not data:
+            map_cache.invalidate(new_data.version)
+
+            # Regions with data but no outline aren't shown on the map
+            missing = regions().missing(new_data.county_store.counties)
+            if missing:
+                print(
+                    "%i regions have no outline in %s, e.g. %s"
+                    % (len(missing), config["GEOJSON_PATH"], missing[0])
+                )
+
+            if config["WARM_MAP_CACHE"]:
+                warmMapCache(new_data, map_cache)
+
+        return new_data
+
+    # With SHARED_DATA_DIR set the snapshots are published to memory mapped
+    # files shared by every worker. The workers check for a newer snapshot
+    # every SHARED_POLL_INTERVAL seconds and the datasets are read again by
+    # one of them every REFRESH_INTERVAL seconds
+    shared = None
+    interval = config["REFRESH_INTERVAL"]
+    if config["SHARED_DATA_DIR"]:
+        shared = SharedSnapshots(config["SHARED_DATA_DIR"])
+        if interval:
+            interval = min(interval, config["SHARED_POLL_INTERVAL"])
+
+    # Holder of the current data snapshot, reloaded in the background every
+    # interval seconds
+    refresher = DataRefresher(loadSnapshot, interval=interval)
+
+    # Cache of the results of the server side callbacks shared by every
+    # user, results of older data versions are dropped when new data is
+    # loaded
+    if config["CALLBACK_CACHE"] == "memory":
+        backend = LRUCache(
+            config["CALLBACK_CACHE_SIZE"], config["CALLBACK_CACHE_TTL"]
         )
-        fig.update_layout(title="Daily Covid Cases", margin=dict(l=0, r=0, t=50, b=50))
-
-    elif dropdown == "active":
-        fig = go.Figure(
-            go.Scatter(
-                x=df_ireland["Date"],
-                y=df_ireland["EstimatedActiveCases"],
-                mode="lines+markers",
-            )
+    elif config["CALLBACK_CACHE"] == "filesystem":
+        backend = FileCache(
+            config["CALLBACK_CACHE_DIR"],
+            config["CALLBACK_CACHE_SIZE"],
+            config["CALLBACK_CACHE_TTL"],
         )
-        fig.update_layout(
-            title="Estimate of Active Covid Cases", margin=dict(l=0, r=0, t=50, b=50)
+    else:
+        backend = None
+    callback_cache = CallbackCache(backend, refresher.get)
+
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+    app.refresher = refresher
+    app.callback_cache = callback_cache
+    app.metrics = metrics
+
+    def collectMetrics(metrics):
+        """Function to read the cache statistics and data version for /metrics"""
+        for name, cache in [("callbacks", callback_cache), ("map", map_cache)]:
+            stats = cache.stats()
+            metrics.set("cache_entries", stats["size"], cache=name)
+            metrics.set("cache_hits_total", stats["hits"], cache=name)
+            metrics.set("cache_misses_total", stats["misses"], cache=name)
+        if refresher.current is not None:
+            metrics.set("data_version", refresher.current.version)
+
+    metrics.collectors.append(collectMetrics)
+    metrics.install(app.server)
+
+    def layout():
+        # Dash builds the layout once outside of a request to validate the
+        # callbacks, it doesn't need any data to do that
+        if not flask.has_request_context():
+            return serveLayout(None, None, config["PLAYBACK_FPS"])
+        return serveLayout(
+            refresher.get(), regions(), config["PLAYBACK_FPS"], config["MAP_ZOOM"]
         )
 
-    fig.update_layout(height=350, legend=dict(x=0.625, y=0.99))
-    fig.update_xaxes(tickangle=45)
-    return fig
+    app.layout = layout
 
+    @app.callback(
+        Output("map-values", "data"),
+        [
+            dash.dependencies.Input("map-slider", "value"),
+            dash.dependencies.Input("map-dropdown", "value"),
+            dash.dependencies.Input("map-mode", "value"),
+            dash.dependencies.Input("map-range-slider", "value"),
+        ],
+    )
+    @metrics.callback
+    @callback_cache.memoize
+    def update_map_figure(data, slider, dropdown, mode, date_range):
+        """
+        Function to return the values plotted on the map, values are built
+        once per date, or range of dates, and dropdown value and then served
+        from the map cache
+        """
+        if mode == "range":
+            start, end = sorted(toDay(unixToDatetime(value)) for value in date_range)
+            key = (data.version, start, end, dropdown)
+            return map_cache.getOrBuild(
+                key, metrics.build(buildRangeValues), data, start, end, dropdown
+            )
 
-@app.callback(
-    Output("irl-breakdown", "figure"),
-    [
-        dash.dependencies.Input("breakdown-dropdown", "value"),
-        dash.dependencies.Input("map-slider", "value"),
-    ],
-)
-def update_breakdown_figure(dropdown, slider):
-    """
-    Function to build and return the breakdown figure
-    """
-    df_ireland_slice = df_ireland[
-        df_ireland["Date"].str.contains(unixToDatetime(slider).strftime("%m/%d"))
-    ]
+        date = toDay(unixToDatetime(slider))
+        key = (data.version, date, dropdown)
+        return map_cache.getOrBuild(
+            key, metrics.build(buildMapValues), data, date, dropdown
+        )
 
-    # If there is no data for a given date then return a null graph object
-    if len(df_ireland_slice) < 1:
-        fig = noDataGraph()
+    # The map figure is assembled in the browser from the map values and the
+    # region geometry so the geometry is only downloaded for a new view
+    app.clientside_callback(
+        ClientsideFunction(namespace="irl", function_name="mapFigure"),
+        Output("irl-map", "figure"),
+        [
+            Input("map-values", "data"),
+            Input("map-frame", "data"),
+            Input("map-geometry", "data"),
+        ],
+        [State("figure-template", "data"), State("map-frames", "data")],
+    )
 
-    # Otherwise return a graph object
-    else:
-        if dropdown == "transmission":
-            data = [
-                df_ireland_slice["CommunityTransmission"].iloc[-1],
-                df_ireland_slice["CloseContact"].iloc[-1],
-                df_ireland_slice["TravelAbroad"].iloc[-1],
-            ]
-
-            labels = ["Community", "Close Contact", "Travel Abroad"]
-            title = "% Known Mode of Transmission"
-
-        elif dropdown == "gender":
-            data = [
-                df_ireland_slice["Male"].iloc[-1],
-                df_ireland_slice["Female"].iloc[-1],
-                df_ireland_slice["Unknown"].iloc[-1],
-            ]
-
-            labels = ["Male", "Female", "Unknown"]
-            title = "Gender"
-
-        elif dropdown == "caseAge":
-            data = [
-                df_ireland_slice["Aged1"].iloc[-1],
-                df_ireland_slice["Aged1to4"].iloc[-1],
-                df_ireland_slice["Aged5to14"].iloc[-1],
-                df_ireland_slice["Aged15to24"].iloc[-1],
-                df_ireland_slice["Aged25to34"].iloc[-1],
-                df_ireland_slice["Aged35to44"].iloc[-1],
-                df_ireland_slice["Aged45to54"].iloc[-1],
-                df_ireland_slice["Aged55to64"].iloc[-1],
-                df_ireland_slice["Aged65up"].iloc[-1],
-            ]
-
-            labels = [
-                "Aged >1",
-                "Aged 1-4",
-                "Aged 5-14",
-                "Aged 15-24",
-                "Aged 25-34",
-                "Aged 35-44",
-                "Aged 45-54",
-                "Aged 55-64",
-                "Aged 65+",
-            ]
-            title = "Case Age Profile"
-
-        elif dropdown == "hospitalAge":
-            data = [
-                df_ireland_slice["HospitalisedAged5"].iloc[-1],
-                df_ireland_slice["HospitalisedAged5to14"].iloc[-1],
-                df_ireland_slice["HospitalisedAged15to24"].iloc[-1],
-                df_ireland_slice["HospitalisedAged25to34"].iloc[-1],
-                df_ireland_slice["HospitalisedAged35to44"].iloc[-1],
-                df_ireland_slice["HospitalisedAged45to54"].iloc[-1],
-                df_ireland_slice["HospitalisedAged55to64"].iloc[-1],
-                df_ireland_slice["HospitalisedAged65up"].iloc[-1],
-            ]
-
-            labels = [
-                "Aged 1-4",
-                "Aged 5-14",
-                "Aged 15-24",
-                "Aged 25-34",
-                "Aged 35-44",
-                "Aged 45-54",
-                "Aged 55-64",
-                "Aged 65+",
-            ]
-            title = "Hospitalization Age Profile"
-
-        elif dropdown == "hospitalOdds":
-
-            def percenter(i, j, dp=2):
-                return round((i / j) * 100, dp)
-
-            data = [
-                percenter(
-                    df_ireland_slice["HospitalisedAged5"].iloc[-1],
-                    df_ireland_slice["Aged1to4"].iloc[-1],
-                ),
-                percenter(
-                    df_ireland_slice["HospitalisedAged5to14"].iloc[-1],
-                    df_ireland_slice["Aged5to14"].iloc[-1],
-                ),
-                percenter(
-                    df_ireland_slice["HospitalisedAged15to24"].iloc[-1],
-                    df_ireland_slice["Aged15to24"].iloc[-1],
-                ),
-                percenter(
-                    df_ireland_slice["HospitalisedAged25to34"].iloc[-1],
-                    df_ireland_slice["Aged25to34"].iloc[-1],
-                ),
-                percenter(
-                    df_ireland_slice["HospitalisedAged35to44"].iloc[-1],
-                    df_ireland_slice["Aged35to44"].iloc[-1],
-                ),
-                percenter(
-                    df_ireland_slice["HospitalisedAged45to54"].iloc[-1],
-                    df_ireland_slice["Aged45to54"].iloc[-1],
-                ),
-                percenter(
-                    df_ireland_slice["HospitalisedAged55to64"].iloc[-1],
-                    df_ireland_slice["Aged55to64"].iloc[-1],
-                ),
-                percenter(
-                    df_ireland_slice["HospitalisedAged65up"].iloc[-1],
-                    df_ireland_slice["Aged65up"].iloc[-1],
-                ),
-            ]
-
-            labels = [
-                "Aged 1-4",
-                "Aged 5-14",
-                "Aged 15-24",
-                "Aged 25-34",
-                "Aged 35-44",
-                "Aged 45-54",
-                "Aged 55-64",
-                "Aged 65+",
-            ]
-            title = "% Likelihood of Hospitalization by Age"
-
-        if np.isnan(data).any():
-            return noDataGraph()
-
-        fig = go.Figure(
-            data=[go.Bar(x=labels, y=data, text=data, textposition="outside",),],
+    @app.callback(
+        [Output("map-geometry", "data"), Output("map-view", "data")],
+        [dash.dependencies.Input("irl-map", "relayoutData")],
+        [State("map-view", "data")],
+    )
+    @metrics.callback
+    def update_map_geometry(relayout, view):
+        """
+        Function to return the region geometry for the map's zoom level and
+        the area around its centre, when the map has been zoomed or panned
+        out of the view the browser has
+        """
+        if not relayout or "mapbox.zoom" not in relayout:
+            raise PreventUpdate
+
+        layer = regions()
+        zoom, center = relayout["mapbox.zoom"], relayout["mapbox.center"]
+        if list(layer.viewKey(zoom, center["lat"], center["lon"])) == view:
+            raise PreventUpdate
+
+        build = metrics.build(mapGeometry)
+        geometry = build(refresher.get(), layer, zoom, center)
+        return geometry, geometry["view"]
+
+    @app.callback(
+        Output("map-frames", "data"),
+        [dash.dependencies.Input("map-play", "n_clicks")],
+        [State("map-dropdown", "value"), State("map-interval", "n_intervals")],
+    )
+    @metrics.callback
+    def update_map_frames(n_clicks, dropdown, n_intervals):
+        """
+        Function to return every frame of the map for playback, built once
+        per data version and dropdown value. The interval count playback
+        starts from is sent with them so the browser can number the frames.
+        """
+        if not n_clicks:
+            raise PreventUpdate
+
+        data = refresher.get()
+        key = (data.version, "frames", dropdown)
+        frames = map_cache.getOrBuild(
+            key, metrics.build(buildMapFrames), data, dropdown
         )
-        fig.update_layout(title=title, margin=dict(l=0, r=0, t=50, b=50))
+        return dict(frames, start=n_intervals or 0)
+
+    # Playback steps through the frames in the browser on each tick of the
+    # interval, with no further requests to the server
+    app.clientside_callback(
+        ClientsideFunction(namespace="irl", function_name="playback"),
+        [Output("map-frame", "data"), Output("map-interval", "disabled")],
+        [Input("map-interval", "n_intervals"), Input("map-frames", "data")],
+    )
+
+    # The slider label and the totals figure only depend on data the browser
+    # already has so they are updated clientside without a server round trip
+    app.clientside_callback(
+        ClientsideFunction(namespace="irl", function_name="sliderLabel"),
+        Output("slider-output-container", "children"),
+        [
+            Input("map-slider", "value"),
+            Input("map-range-slider", "value"),
+            Input("map-mode", "value"),
+        ],
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="irl", function_name="sliderMode"),
+        [
+            Output("map-slider-container", "style"),
+            Output("map-range-container", "style"),
+        ],
+        [Input("map-mode", "value")],
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="irl", function_name="totalsFigure"),
+        Output("irl-totals", "figure"),
+        [Input("total-dropdown", "value")],
+        [State("totals-figures", "data"), State("figure-template", "data")],
+    )
+
+    @app.callback(
+        Output("irl-breakdown", "figure"),
+        [
+            dash.dependencies.Input("breakdown-dropdown", "value"),
+            dash.dependencies.Input("map-slider", "value"),
+        ],
+    )
+    @metrics.callback
+    @callback_cache.memoize
+    def update_breakdown_figure(data, dropdown, slider):
+        """
+        Function to build and return the breakdown figure
+        """
+        build = metrics.build(buildBreakdownFigure)
+        return build(data, dropdown, unixToDatetime(slider))
+
+    if config["PRELOAD"]:
+        refresher.refresh()
+        regions()
 
-    return fig
+    return app
 
 
 if __name__ == "__main__":
+    app = create_app()
     app.run_server(debug=True, host='0.0.0.0')
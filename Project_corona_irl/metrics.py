@@ -0,0 +1,221 @@
+import functools
+import json
+import threading
+import time
+
+import flask
+
+# Histogram buckets of durations in seconds and response sizes in bytes
+time_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+size_buckets = tuple(256 * 4**i for i in range(9))
+
+
+class Metrics:
+    """
+    Registry of the app's counters, gauges and histograms, served in the
+    Prometheus text format by render. The values are those of this process,
+    with several workers each one is scraped separately.
+
+    Functions added to collectors are called on each render to set values
+    that are read rather than counted, such as the cache sizes.
+    """
+
+    def __init__(self, enabled=True, log=False):
+        self.enabled = enabled
+        self.log = log
+        self.collectors = []
+        self._types = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help, buckets=None):
+        """Add a metric, kind being counter, gauge or histogram"""
+        self._types[name] = (kind, help, buckets)
+
+    def _key(self, name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set the value of a gauge, or of a counter kept elsewhere"""
+        with self._lock:
+            self._values[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Add an observation to a histogram"""
+        buckets = self._types[name][2]
+        key = self._key(name, labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self):
+        """Return every metric in the Prometheus text format"""
+        for collector in self.collectors:
+            collector(self)
+
+        with self._lock:
+            values = sorted(self._values.items())
+
+        lines = []
+        for name, (kind, help, buckets) in self._types.items():
+            lines.append("# HELP %s %s" % (name, help))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for (metric, labels), value in values:
+                if metric != name:
+                    continue
+                if kind != "histogram":
+                    lines.append("%s%s %s" % (name, formatLabels(labels), value))
+                    continue
+
+                for bound, count in zip(buckets + ("+Inf",), value[:-1]):
+                    le = labels + (("le", str(bound)),)
+                    lines.append("%s_bucket%s %i" % (name, formatLabels(le), count))
+                lines.append("%s_sum%s %s" % (name, formatLabels(labels), value[-1]))
+                lines.append("%s_count%s %i" % (name, formatLabels(labels), value[-2]))
+
+        return "\n".join(lines) + "\n"
+
+    def callback(self, function):
+        """
+        Decorator timing a server side callback. The time spent in functions
+        decorated with build is its build phase and the rest of the callback
+        its lookup phase. The serialisation phase and the response size are
+        recorded by afterRequest once dash has made the response.
+        """
+        if not self.enabled:
+            return function
+        name = function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            flask.g.metrics_build = 0
+            start = time.time()
+            result = function(*args)
+            end = time.time()
+
+            build = flask.g.metrics_build
+            self.observe(
+                "callback_seconds", end - start - build, callback=name, phase="lookup"
+            )
+            self.observe("callback_seconds", build, callback=name, phase="build")
+            flask.g.metrics_callback = (name, end, end - start - build, build)
+            return result
+
+        return wrapper
+
+    def build(self, function):
+        """Decorator adding the time spent in function to a callback's build phase"""
+        if not self.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            start = time.time()
+            try:
+                return function(*args)
+            finally:
+                if flask.has_request_context() and "metrics_build" in flask.g:
+                    flask.g.metrics_build += time.time() - start
+
+        return wrapper
+
+    def afterRequest(self, response):
+        """
+        Flask after request hook recording the time dash took to serialise
+        a timed callback's result and the size of the response
+        """
+        timed = flask.g.pop("metrics_callback", None)
+        if timed is None:
+            return response
+
+        name, returned, lookup, build = timed
+        serialise = time.time() - returned
+        size = response.calculate_content_length() or 0
+        self.observe("callback_seconds", serialise, callback=name, phase="serialise")
+        self.observe("callback_response_bytes", size, callback=name)
+
+        if self.log:
+            print(
+                json.dumps(
+                    {
+                        "callback": name,
+                        "lookup": round(lookup, 6),
+                        "build": round(build, 6),
+                        "serialise": round(serialise, 6),
+                        "bytes": size,
+                        "status": response.status_code,
+                    }
+                )
+            )
+        return response
+
+    def install(self, server):
+        """Add the /metrics route and the after request hook to a flask server"""
+        if not self.enabled:
+            return
+        server.after_request(self.afterRequest)
+        server.add_url_rule(
+            "/metrics",
+            "metrics",
+            lambda: flask.Response(self.render(), mimetype="text/plain; version=0.0.4"),
+        )
+
+
+def formatLabels(labels):
+    """Return labels as a Prometheus label set, empty if there are none"""
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+
+
+def appMetrics(enabled=True, log=False):
+    """
+    Function to return the registry of the dashboard's metrics: callback
+    phase timings and response sizes, data load timings, cache statistics
+    and the data version
+    """
+    metrics = Metrics(enabled, log)
+    metrics.describe(
+        "callback_seconds",
+        "histogram",
+        "Time spent in each phase of a server side callback",
+        time_buckets,
+    )
+    metrics.describe(
+        "callback_response_bytes",
+        "histogram",
+        "Size of the responses of the server side callbacks",
+        size_buckets,
+    )
+    metrics.describe(
+        "dataset_load_seconds",
+        "histogram",
+        "Time taken to load each dataset, by where it was loaded from",
+        time_buckets,
+    )
+    metrics.describe(
+        "data_refresh_seconds",
+        "histogram",
+        "Time taken to load a new snapshot of the data",
+        time_buckets,
+    )
+    metrics.describe("data_version", "gauge", "Version of the data being served")
+    metrics.describe("cache_entries", "gauge", "Number of entries in each cache")
+    metrics.describe("cache_hits_total", "counter", "Number of cache hits")
+    metrics.describe("cache_misses_total", "counter", "Number of cache misses")
+    return metrics
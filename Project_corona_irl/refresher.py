@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+
+class DataRefresher:
+    """
+    Holder of the current data snapshot which can rebuild it in a
+    background thread every interval seconds.
+
+    load(version) is called off the request path to build a complete new
+    snapshot, normally of the given version although it may skip ahead
+    when the snapshots are shared with other processes. The new snapshot
+    is then swapped in with a single reference assignment, so readers of
+    current get either the old snapshot or the new one and never a half
+    updated state. If a load fails, or load returns the current snapshot
+    because there is no new data, the current snapshot keeps being served.
+
+    Nothing is loaded until get is first called, or refresh is called to
+    load the data up front. Threads don't survive a fork, so get starts the
+    background refresh in whichever process it is called from, letting the
+    data be loaded once in a parent process and shared by forked workers.
+    """
+
+    def __init__(self, load, interval=3600):
+        self.load = load
+        self.interval = interval
+        self.current = None
+        self.version = 0
+        self._lock = threading.Lock()
+        self._first_load = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def get(self):
+        """
+        Return the current snapshot, loading it first if nothing has been
+        loaded yet, and make sure the background refresh is running in this
+        process
+        """
+        if self.current is None:
+            with self._first_load:
+                if self.current is None:
+                    self.refresh()
+
+        if self._pid != os.getpid():
+            self.start()
+
+        return self.current
+
+    def refresh(self):
+        """Load a new snapshot and swap it in, returns True if it was swapped"""
+        with self._lock:
+            start = time.time()
+            try:
+                snapshot = self.load(self.version + 1)
+            except Exception as e:
+                if self.current is None:
+                    raise
+                print("Data refresh failed, keeping version %i: %s" % (self.version, e))
+                return False
+
+            if snapshot is self.current:
+                print("No new data, keeping version %i" % self.version)
+                return False
+
+            self.version = snapshot.version
+            self.current = snapshot
+            print(
+                "Data version %i loaded in %.2fs" % (self.version, time.time() - start)
+            )
+            return True
+
+    def start(self):
+        """Start refreshing the data in a background thread"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        if not self.interval:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="data-refresher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, waiting for a running refresh to end"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
@@ -0,0 +1,197 @@
+import math
+
+import numpy as np
+
+from cache import LRUCache
+from geometry import simplifyGeometry
+
+# Size in pixels of the map the geometry is cut to and the zoom levels the
+# geometry is simplified for, zooming in further uses the last level
+viewport = (1200, 800)
+min_level, max_level = 3, 12
+
+
+def degreesPerPixel(zoom):
+    """Return the width of a pixel in degrees of longitude at a mapbox zoom"""
+    return 360 / (256 * 2**zoom)
+
+
+def geometryBounds(geometry):
+    """Return the [min lon, min lat, max lon, max lat] of a geometry"""
+    points = []
+
+    def collect(coordinates):
+        if isinstance(coordinates[0], (int, float)):
+            points.append(coordinates[:2])
+        else:
+            for c in coordinates:
+                collect(c)
+
+    collect(geometry["coordinates"])
+    points = np.asarray(points, dtype=float)
+    return np.concatenate([points.min(axis=0), points.max(axis=0)])
+
+
+class RegionLayer:
+    """
+    Map layer of the regions of a geojson FeatureCollection, matched to the
+    region ids of the data by the feature property id_property.
+
+    The layer is indexed once when it is loaded: by region id, and by the
+    bounding box of every feature so the features in an area of the map
+    are found with one vectorised comparison. A few thousand boxes don't
+    need anything cleverer than that.
+
+    The browser is sent a view of the layer for its zoom level: each
+    feature simplified to a pixel at that zoom, and once the layer no
+    longer fits in the viewport only the features around the area being
+    looked at. Features are simplified the first time they are needed at
+    a level and the views are cached, keyed by viewKey.
+    """
+
+    def __init__(self, geojson, id_property="county", cache_size=64):
+        self.id_property = id_property
+        self.featureidkey = "properties." + id_property
+        self.features = geojson["features"]
+
+        # Region id index
+        self.ids = [str(f["properties"][id_property]) for f in self.features]
+        self.index = {region: i for i, region in enumerate(self.ids)}
+
+        # Spatial index, the bounding box of each feature
+        self.bounds = np.array([geometryBounds(f["geometry"]) for f in self.features])
+        self.extent = np.concatenate(
+            [self.bounds[:, :2].min(axis=0), self.bounds[:, 2:].max(axis=0)]
+        )
+
+        # Latitude is stretched by the map projection, the scale at the
+        # centre of the layer is used for all of it
+        self._lat_scale = math.cos(math.radians(self.center()["lat"]))
+        self._simplified = {}
+        self._views = LRUCache(cache_size)
+
+    def __len__(self):
+        return len(self.features)
+
+    def center(self):
+        """Return the centre of the layer as a mapbox center"""
+        lon = (self.extent[0] + self.extent[2]) / 2
+        lat = (self.extent[1] + self.extent[3]) / 2
+        return {"lat": float(lat), "lon": float(lon)}
+
+    def missing(self, regions):
+        """Return the regions, e.g. of the data, that have no feature"""
+        return [region for region in regions if str(region) not in self.index]
+
+    def intersecting(self, bounds):
+        """Return the indices of the features whose bounding box meets bounds"""
+        min_lon, min_lat, max_lon, max_lat = bounds
+        return np.flatnonzero(
+            (self.bounds[:, 0] <= max_lon)
+            & (self.bounds[:, 2] >= min_lon)
+            & (self.bounds[:, 1] <= max_lat)
+            & (self.bounds[:, 3] >= min_lat)
+        )
+
+    def level(self, zoom):
+        """Return the zoom level the geometry is simplified for at a zoom"""
+        return int(min(max(math.floor(zoom), min_level), max_level))
+
+    def viewKey(self, zoom, lat, lon):
+        """
+        Return the key of the view of the layer for a map's zoom and centre,
+        (level, None) if the whole layer fits in the viewport or else
+        (level, column, row) of the viewport sized cell of the centre
+        """
+        level = self.level(zoom)
+        width = viewport[0] * degreesPerPixel(level)
+        height = viewport[1] * degreesPerPixel(level) * self._lat_scale
+        if (
+            self.extent[2] - self.extent[0] <= width
+            and self.extent[3] - self.extent[1] <= height
+        ):
+            return (level, None)
+        return (level, math.floor(lon / width), math.floor(lat / height))
+
+    def _feature(self, i, level):
+        """Return a feature simplified for a level"""
+        simplified = self._simplified.setdefault(level, {})
+        feature = simplified.get(i)
+        if feature is None:
+            feature = self.features[i]
+            geometry = simplifyGeometry(feature["geometry"], degreesPerPixel(level))
+            feature = simplified[i] = dict(feature, geometry=geometry)
+        return feature
+
+    def view(self, zoom, lat, lon):
+        """
+        Return the key and the geojson of the view of the layer for a map's
+        zoom and centre. A view cut to an area covers the 3 x 3 viewport
+        sized cells around the centre, so the map can be panned by up to
+        a viewport before it needs another.
+        """
+        key = self.viewKey(zoom, lat, lon)
+        return key, self._views.getOrBuild(key, self._buildView, key)
+
+    def _buildView(self, key):
+        level = key[0]
+        if key[1] is None:
+            indices = range(len(self.features))
+        else:
+            width = viewport[0] * degreesPerPixel(level)
+            height = viewport[1] * degreesPerPixel(level) * self._lat_scale
+            column, row = key[1:]
+            indices = self.intersecting(
+                [
+                    (column - 1) * width,
+                    (row - 1) * height,
+                    (column + 2) * width,
+                    (row + 2) * height,
+                ]
+            )
+        return {
+            "type": "FeatureCollection",
+            "features": [self._feature(i, level) for i in indices],
+        }
+
+
+def syntheticRegions(count, bounds=(-10.5, 51.4, -6.0, 55.4), points=20, seed=0):
+    """
+    Function to return a geojson FeatureCollection of count regions tiling
+    bounds, each a grid cell with points jittered points along each edge so
+    there is something to simplify. The regions are named "Region <n>" in
+    their "county" property, for testing and benchmarking with many regions.
+    """
+    rng = np.random.default_rng(seed)
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    width = (bounds[2] - bounds[0]) / columns
+    height = (bounds[3] - bounds[1]) / rows
+
+    # Points along a unit edge, jittered across it
+    steps = np.linspace(0, 1, points, endpoint=False)
+
+    features = []
+    for n in range(count):
+        row, column = divmod(n, columns)
+        x0, y0 = bounds[0] + column * width, bounds[1] + row * height
+        corners = [(x0, y0), (x0 + width, y0), (x0 + width, y0 + height)]
+        corners += [(x0, y0 + height), (x0, y0)]
+
+        ring = []
+        for (ax, ay), (bx, by) in zip(corners[:-1], corners[1:]):
+            jitter = rng.normal(0, min(width, height) / 50, points)
+            jitter[0] = 0
+            xs = ax + (bx - ax) * steps + jitter * (ay != by)
+            ys = ay + (by - ay) * steps + jitter * (ax != bx)
+            ring += np.column_stack([xs, ys]).tolist()
+        ring.append(ring[0])
+
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {"county": "Region %i" % n},
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,170 @@
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from columncache import readArray, readFrame, writeArray, writeFrame
+from datastore import CountyStore, IrelandStore, RangeStore, Snapshot
+
+
+class SharedSnapshots:
+    """
+    Snapshots published to memory mapped files so several worker processes
+    can serve one copy of the data.
+
+    Each published snapshot is written to its own directory, <version>/,
+    as numpy arrays: one date x county array per county metric, one 2D
+    array per column type of the national table, the date x column matrix
+    of the national store and the prefix sums. current.json is then
+    replaced to point at it, so the version counter in current.json only
+    ever names a complete snapshot. Workers attach to a snapshot by memory
+    mapping its arrays, the pages are shared through the page cache so
+    the memory used by each worker stays flat however long the history
+    grows. Only the newest few snapshots are kept, workers still using an
+    older one keep their mapping of it after its files are removed.
+    """
+
+    def __init__(self, directory, keep=2):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Hold an exclusive lock across processes on the published snapshots"""
+        with open(os.path.join(self.directory, "lock"), "w") as myfile:
+            fcntl.flock(myfile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(myfile, fcntl.LOCK_UN)
+
+    def latest(self):
+        """
+        Return the version and published time of the newest snapshot as a
+        dict, or None if nothing has been published yet
+        """
+        try:
+            with open(os.path.join(self.directory, "current.json")) as myfile:
+                return json.load(myfile)
+        except (OSError, ValueError):
+            return None
+
+    def _setLatest(self, version):
+        path = os.path.join(self.directory, "current.json")
+        with open(path + ".tmp", "w") as myfile:
+            json.dump({"version": version, "published": time.time()}, myfile)
+        os.replace(path + ".tmp", path)
+
+    def publish(self, snapshot):
+        """
+        Write a snapshot and make it the newest one. Publishing the newest
+        snapshot again only updates its published time, which records that
+        the datasets were checked and hadn't changed.
+        """
+        latest = self.latest()
+        if latest is not None and latest["version"] == snapshot.version:
+            self._setLatest(snapshot.version)
+            return
+
+        directory = os.path.join(self.directory, str(snapshot.version))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+        county_store = snapshot.county_store
+        ireland_store, ranges = snapshot.ireland_store, snapshot.ranges
+        meta = {
+            "version": snapshot.version,
+            "active_window": snapshot.active_window,
+            "rolling_window": snapshot.rolling_window,
+            "key": county_store.key,
+            "counties": writeArray(
+                directory, "counties", np.asarray(county_store.counties, dtype=str)
+            ),
+            "dates": writeArray(directory, "dates", county_store.dates),
+            "metrics": {
+                metric: writeArray(directory, "county-%i" % i, values)
+                for i, (metric, values) in enumerate(county_store.values.items())
+            },
+            "maxima": {
+                metric: float(county_store.max(metric))
+                for metric in county_store.values
+            },
+            "ireland": writeFrame(snapshot.df_ireland, directory, "ireland"),
+            "national": {
+                "columns": list(ireland_store.columns),
+                "matrix": writeArray(directory, "national", ireland_store.matrix),
+                "dates": writeArray(directory, "national-dates", ireland_store.dates),
+            },
+            "ranges": {
+                name: writeArray(directory, "ranges-%s" % name, getattr(ranges, name))
+                for name in ("county_sums", "national_sums", "population")
+            },
+            "figures": snapshot.figures,
+            "dataset_keys": snapshot.dataset_keys,
+        }
+        with open(os.path.join(directory, "meta.json"), "w") as myfile:
+            json.dump(meta, myfile)
+
+        self._setLatest(snapshot.version)
+        self._prune(snapshot.version)
+
+    def _prune(self, version):
+        """Remove all but the newest keep snapshots"""
+        for name in os.listdir(self.directory):
+            if name.isdigit() and int(name) <= version - self.keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def attach(self, version):
+        """Return a snapshot backed by the memory mapped arrays of a version"""
+        directory = os.path.join(self.directory, str(version))
+        with open(os.path.join(directory, "meta.json")) as myfile:
+            meta = json.load(myfile)
+
+        county_store = CountyStore.fromArrays(
+            readArray(directory, meta["counties"]),
+            readArray(directory, meta["dates"]),
+            {
+                metric: readArray(directory, filename)
+                for metric, filename in meta["metrics"].items()
+            },
+            meta["maxima"],
+            # Snapshots written before regions had a key are keyed by county
+            meta.get("key", "CountyName"),
+        )
+
+        # Snapshots written before the national store and prefix sums were
+        # shared have them built here
+        ireland_store = ranges = None
+        if "ranges" in meta:
+            national = meta["national"]
+            ireland_store = IrelandStore.fromArrays(
+                national["columns"],
+                readArray(directory, national["matrix"]),
+                readArray(directory, national["dates"]),
+            )
+            sums = meta["ranges"]
+            ranges = RangeStore.fromArrays(
+                county_store,
+                ireland_store,
+                readArray(directory, sums["county_sums"]),
+                readArray(directory, sums["national_sums"]),
+                readArray(directory, sums["population"]),
+            )
+
+        snapshot = Snapshot.fromData(
+            readFrame(directory, meta["ireland"]),
+            county_store,
+            meta["version"],
+            meta["active_window"],
+            meta["rolling_window"],
+            ireland_store,
+            ranges,
+        )
+        snapshot.figures.update(meta["figures"])
+        snapshot.dataset_keys = meta.get("dataset_keys")
+        return snapshot
@@ -0,0 +1,15 @@
+"""
+WSGI entry point of the dashboard, e.g.
+
+    gunicorn wsgi:server
+
+or, to load the data once in the gunicorn master and share it with the
+workers,
+
+    PRELOAD=1 gunicorn --preload wsgi:server
+"""
+
+from ireland_dash import create_app
+
+app = create_app()
+server = app.server